@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Encode and decode throughput of each installed json_codec backend over the data dumps
+import argparse
+import glob
+import os
+import sys
+import time
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from utilities import json_codec
+from workflows.sku_record import loads_skus
+
+DATA_DIRS = ('products', 'products_new', 'skus', 'skus_missed', 'skus_new', 'errors', 'mappings')
+
+
+def best_of(repeat, function, items):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            function(item)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare json_codec backends on the repo data')
+    parser.add_argument('paths', nargs='*',
+                        default=sorted(path for directory in DATA_DIRS
+                                       for path in glob.glob(os.path.join(ROOT_PATH, 'data', directory, '*.json'))))
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement, the best one is kept')
+    args = parser.parse_args()
+
+    texts = list()
+    for path in args.paths:
+        with open(path, 'rb') as dump:
+            texts.append(dump.read())
+    megabytes = sum(len(text) for text in texts) / 1e6
+    sku_texts = [text for text, path in zip(texts, args.paths) if os.sep + 'skus' in path]
+    print('{} files, {:.1f} MB, {} sku dumps'.format(len(texts), megabytes, len(sku_texts)))
+
+    print('{:<8} {:>12} {:>14} {:>15} {:>14} {:>13}'.format(
+        'backend', 'decode MB/s', 'pretty enc MB/s', 'compact enc MB/s', 'compact size', 'loads_skus s'))
+    for name in json_codec.BACKENDS:
+        try:
+            backend = json_codec.set_backend(name)
+        except ImportError:
+            print('{:<8} not installed'.format(name))
+            continue
+        values = [backend.loads(text) for text in texts]
+        decode = best_of(args.repeat, backend.loads, texts)
+        pretty = best_of(args.repeat, backend.dumps, values)
+        compact = best_of(args.repeat, lambda value: backend.dumps(value, pretty=False), values)
+        compact_size = sum(len(backend.dumpb(value, pretty=False)) for value in values) / 1e6
+        skus = best_of(args.repeat, loads_skus, sku_texts)
+        print('{:<8} {:>12.1f} {:>14.1f} {:>15.1f} {:>11.1f} MB {:>13.3f}'.format(
+            name, megabytes / decode, megabytes / pretty, megabytes / compact, compact_size, skus))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Offline benchmark of the scrape-transform-load pipeline against the replay server
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('KISS_AND_MAKEUP_ROOT', ROOT_PATH)
+sys.path.insert(0, ROOT_PATH)
+
+from benchmarks.replay_server import ReplayServer, ReplayStore
+from benchmarks.stats import StageTimer, count_items, format_summary
+
+
+def instrument_crawl(timer, scraper):
+    timer.wrap(scraper, 'get_product_data', 'listing', count_items)
+    timer.wrap(scraper, 'get_product_sku_ids', 'product')
+    timer.wrap(scraper, 'save_product_data', 'serialize')
+    timer.wrap(scraper.sku_scraper, 'save_sku_data', 'skus', count_items)
+
+
+def instrument_load(timer, loader):
+    timer.wrap(loader, 'read_products_data', 'parse', count_items)
+    timer.wrap(loader, 'transform_product_data', 'transform')
+    timer.wrap(loader, 'post_product_data', 'upload')
+
+
+def get_work_path(work_path=None):
+    work_path = work_path or tempfile.mkdtemp(prefix='kiss_and_makeup_bench_')
+    for directory in ('products', 'skus', 'errors'):
+        os.makedirs(os.path.join(work_path, directory), exist_ok=True)
+    return work_path
+
+
+def redirect_scraper(scraper, url, work_path):
+    scraper.API_URL = '{url}/rest'.format(url=url)
+    scraper.PRODUCT_ENDPOINT = '{url}/rest/products'.format(url=url)
+    scraper.product_path = os.path.join(work_path, 'products')
+    scraper.sku_scraper.SKU_ENDPOINT = '{url}/global/json/getSkuJson.jsp'.format(url=url)
+    scraper.sku_scraper.data_path = work_path
+    scraper.sku_scraper.sku_path = os.path.join(work_path, 'skus')
+    return scraper
+
+
+def select_categories(scraper, store, categories=None, limit=None):
+    selected = {k: v for k, v in scraper.categories.items()
+                if k.replace('.json', '') in store.categories
+                and (not categories or k in categories)}
+    if limit:
+        selected = dict(list(selected.items())[:limit])
+    return selected
+
+
+def run(categories=None, limit=None, work_path=None):
+    from workflows.sephora_loader import SephoraLoader
+    from workflows.sephora_scraper_static import ProductScraper
+
+    store = ReplayStore.from_dumps(os.path.join(ROOT_PATH, 'data'))
+    work_path = get_work_path(work_path)
+    timer = StageTimer()
+
+    with ReplayServer(store) as server:
+        scraper = redirect_scraper(ProductScraper(), server.url, work_path)
+        instrument_crawl(timer, scraper)
+
+        selected = select_categories(scraper, store, categories, limit)
+
+        start = time.perf_counter()
+        scraper.save_products_data(selected)
+        timer.record('crawl', time.perf_counter() - start, len(selected))
+
+        loader = SephoraLoader()
+        loader.API_URL = server.url
+        loader.sku_path = os.path.join(work_path, 'skus')
+        instrument_load(timer, loader)
+
+        start = time.perf_counter()
+        loader.process()
+        timer.record('load', time.perf_counter() - start, len(os.listdir(loader.sku_path)))
+
+    return timer.summary()
+
+
+def compare(summary, baseline, tolerance):
+    regressions = list()
+    for stage, stats in baseline.items():
+        current = summary.get(stage, None)
+        if not current or not stats['items_per_second'] or not current['items_per_second']:
+            continue
+        change = current['items_per_second'] / stats['items_per_second'] - 1
+        if change < -tolerance:
+            regressions.append('{stage}: {before:.1f} -> {after:.1f} items/s ({change:+.0%})'.format(
+                stage=stage,
+                before=stats['items_per_second'],
+                after=current['items_per_second'],
+                change=change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the crawl and load pipeline offline')
+    parser.add_argument('--category', action='append', dest='categories',
+                        help='revised category file name, e.g. lipstick.json (repeatable)')
+    parser.add_argument('--limit', type=int, help='only crawl the first N categories')
+    parser.add_argument('--work-path', help='directory for the files written by the run')
+    parser.add_argument('--output', help='write the stage summary to this json file')
+    parser.add_argument('--baseline', help='compare against a previous --output file')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='allowed throughput drop before a stage counts as a regression')
+    args = parser.parse_args()
+
+    summary = run(args.categories, args.limit, args.work_path)
+    print(format_summary(summary))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as outfile:
+            json.dump(summary, outfile, sort_keys=True, indent=4)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline:
+            regressions = compare(summary, json.loads(baseline.read()), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION', regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
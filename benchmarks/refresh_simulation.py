@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Simulated weeks of RefreshScheduler against periodic full re-crawls
+#
+# Each revised category gets a synthetic size and a Poisson change rate
+# spread log-uniformly between --fastest-hours and --slowest-days. Both
+# strategies are scored on requests sent and on how long a change goes
+# unseen before the next crawl of its category.
+import argparse
+import bisect
+import math
+import os
+import random
+import sys
+import tempfile
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('KISS_AND_MAKEUP_ROOT', ROOT_PATH)
+sys.path.insert(0, ROOT_PATH)
+
+from utilities import json_codec
+from workflows.crawl_scheduler import CrawlScheduler
+from workflows.refresh_scheduler import RefreshScheduler, get_requests
+
+HOUR = 3600.0
+
+
+class SimulatedRefresh(RefreshScheduler):
+
+    def __init__(self, changes, **kwargs):
+        super(SimulatedRefresh, self).__init__(**kwargs)
+        self.changes = changes
+        self.now = 0
+        self.crawls = {category: list() for category in changes}
+
+    def crawl_category(self, category, revised_category):
+        self.crawls[category].append(self.now)
+        version = bisect.bisect_right(self.changes[category], self.now)
+        return {'products': str(version)}
+
+    def tick(self, now, categories=None):
+        self.now = now
+        return super(SimulatedRefresh, self).tick(now, categories)
+
+
+def make_categories(rng, names, fastest_hours, slowest_days, horizon):
+    costs, rates, changes = dict(), dict(), dict()
+    low, high = math.log(1 / (slowest_days * 24.0)), math.log(1 / float(fastest_hours))
+    for name in names:
+        products = int(rng.lognormvariate(4.5, 0.8))
+        costs[name] = {'pages': int(math.ceil(products / 300.0)), 'products': products}
+        rates[name] = math.exp(rng.uniform(low, high))
+        events, at = list(), 0.0
+        while True:
+            at += rng.expovariate(rates[name]) * HOUR
+            if at >= horizon:
+                break
+            events.append(at)
+        changes[name] = events
+    return costs, rates, changes
+
+
+def score(crawls, changes, horizon):
+    # hours from each change to the first crawl after it; unseen changes wait until the horizon
+    delays = list()
+    for category, events in changes.items():
+        times = crawls[category]
+        for event in events:
+            index = bisect.bisect_left(times, event)
+            delays.append(((times[index] if index < len(times) else horizon) - event) / HOUR)
+    return delays
+
+
+def summarize(name, crawls, costs, changes, hot, horizon):
+    requests = sum(len(times) * get_requests(costs[category]) for category, times in crawls.items())
+    delays = score(crawls, changes, horizon)
+    hot_delays = score({c: crawls[c] for c in hot}, {c: changes[c] for c in hot}, horizon)
+    return {'strategy': name,
+            'requests': requests,
+            'requests_per_hour': requests / (horizon / HOUR),
+            'mean_delay_hours': sum(delays) / float(len(delays) or 1),
+            'hot_mean_delay_hours': sum(hot_delays) / float(len(hot_delays) or 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare adaptive refresh with full re-crawls')
+    parser.add_argument('--days', type=float, default=14)
+    parser.add_argument('--full-interval-hours', type=float, default=24,
+                        help='how often the baseline re-crawls every category')
+    parser.add_argument('--requests-per-hour', type=int, default=RefreshScheduler.REQUESTS_PER_HOUR)
+    parser.add_argument('--fastest-hours', type=float, default=6, help='mean hours between changes, hottest')
+    parser.add_argument('--slowest-days', type=float, default=60, help='mean days between changes, stablest')
+    parser.add_argument('--tick-minutes', type=float, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with open(os.path.join(ROOT_PATH, 'revised_categories.json'), encoding='utf-8') as categories:
+        names = sorted(k for k, v in json_codec.load(categories).items() if v)
+    rng = random.Random(args.seed)
+    horizon = args.days * 24 * HOUR
+    costs, rates, changes = make_categories(rng, names, args.fastest_hours, args.slowest_days, horizon)
+    hot = sorted(rates, key=rates.get, reverse=True)[:max(len(rates) // 5, 1)]
+
+    baseline = {category: list() for category in names}
+    at = 0.0
+    while at < horizon:
+        for category in names:
+            baseline[category].append(at)
+        at += args.full_interval_hours * HOUR
+
+    scheduler = CrawlScheduler()
+    scheduler.costs = costs
+    state_path = os.path.join(tempfile.mkdtemp(prefix='kiss_and_makeup_refresh_'), 'refresh_state.json')
+    adaptive = SimulatedRefresh(changes, scheduler=scheduler, requests_per_hour=args.requests_per_hour,
+                                state_path=state_path)
+    categories = {name: name for name in names}
+    at = 0.0
+    while at < horizon:
+        adaptive.tick(at, categories)
+        at += args.tick_minutes * 60
+
+    print('{} categories, {} changes over {:g} days, {} hot categories'.format(
+        len(names), sum(len(events) for events in changes.values()), args.days, len(hot)))
+    print('{:<24} {:>10} {:>10} {:>16} {:>16}'.format(
+        'strategy', 'requests', 'req/hour', 'mean delay h', 'hot mean delay h'))
+    for summary in (summarize('full every {:g}h'.format(args.full_interval_hours), baseline, costs, changes,
+                              hot, horizon),
+                    summarize('adaptive {}/h'.format(args.requests_per_hour), adaptive.crawls, costs, changes,
+                              hot, horizon)):
+        print('{:<24} {:>10} {:>10.0f} {:>16.2f} {:>16.2f}'.format(
+            summary['strategy'], summary['requests'], summary['requests_per_hour'],
+            summary['mean_delay_hours'], summary['hot_mean_delay_hours']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Local record/replay stand-in for the Sephora and makeup API endpoints
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_DIRS = ('products', 'products_new')
+SKU_DIRS = ('skus', 'skus_missed', 'skus_new')
+
+
+class ReplayStore:
+
+    def __init__(self):
+        self.categories = dict()
+        self.products = dict()
+        self.skus = dict()
+        self.cassette = dict()
+        self.uploads = dict()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_dumps(cls, data_path):
+        store = cls()
+        for directory in PRODUCT_DIRS:
+            for name, data in cls.read_dumps(os.path.join(data_path, directory)):
+                if data.get('products'):
+                    store.add_category(name.replace('.json', ''), data)
+        for directory in SKU_DIRS:
+            for name, data in cls.read_dumps(os.path.join(data_path, directory)):
+                for sku_number, sku in data.items():
+                    if isinstance(sku, dict) and 'sku_number' in sku:
+                        store.skus[sku_number] = sku
+        return store
+
+    @staticmethod
+    def read_dumps(path):
+        if not os.path.isdir(path):
+            return
+        for filename in sorted(os.listdir(path)):
+            if not filename.endswith('.json'):
+                continue
+            with open(os.path.join(path, filename), encoding='utf-8') as dump:
+                try:
+                    yield filename, json.loads(dump.read())
+                except ValueError:
+                    logger.error('unreadable dump %s', filename)
+
+    def add_category(self, seo_path, data):
+        listing = list()
+        for product in data['products']:
+            self.products[product['id']] = {
+                'id': product['id'],
+                'sku_ids': ','.join(product.get('sku_ids', list())),
+                'quick_look_desc': product.get('quick_look_desc', None),
+            }
+            listing.append({k: v for k, v in product.items()
+                            if k not in ('sku_ids', 'category')})
+        self.categories[seo_path] = {'categories': data.get('categories', dict()),
+                                     'products': listing}
+
+    def load_cassette(self, path):
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as cassette:
+                self.cassette.update(json.loads(cassette.read()))
+
+    def save_cassette(self, path):
+        with open(path, 'w', encoding='utf-8') as cassette:
+            json.dump(self.cassette, cassette, sort_keys=True, indent=4)
+
+    def get_product_page(self, category, page, page_size):
+        data = self.categories.get(category, None)
+        if data is None:
+            return None
+        products = data['products']
+        start = (page - 1) * page_size
+        return {'categories': data['categories'],
+                'page_size': page_size,
+                'products': products[start:start + page_size],
+                'total_products': len(products),
+                'total_pages': int(math.ceil(len(products) / float(page_size)))}
+
+    def get_product(self, product_id):
+        return self.products.get(product_id, None)
+
+    def get_skus(self, sku_ids):
+        skus = [{k: v for k, v in self.skus[sku_id].items() if k != 'category'}
+                for sku_id in sku_ids if sku_id in self.skus]
+        if len(sku_ids) == 1:
+            return skus[0] if skus else None
+        return skus
+
+    def upload(self, product):
+        key = json.dumps(product.get('skus', product), sort_keys=True)
+        with self.lock:
+            if key in self.uploads:
+                return 409
+            self.uploads[key] = product
+            return 201
+
+    def clear_uploads(self):
+        with self.lock:
+            self.uploads.clear()
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # headers and body go out as separate writes; with Nagle on, keep-alive
+    # clients wait out a delayed ack on every response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super(ReplayHandler, self).handle()
+        except ConnectionError:
+            # a client that was killed mid-request, as the shard benchmark does
+            pass
+
+    def do_GET(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        url = urlparse(self.path)
+        query = parse_qs(url.query, keep_blank_values=True)
+        store = self.server.store
+        if self.path in store.cassette:
+            return self.send_body(200, store.cassette[self.path])
+        if self.server.upstream:
+            return self.record()
+        if url.path.rstrip('/') == '/rest/products':
+            data = store.get_product_page(query.get('categoryName', [''])[0],
+                                          int(query.get('currentPage', ['1'])[0]),
+                                          int(query.get('pageSize', ['100'])[0]))
+        elif url.path.startswith('/rest/products/'):
+            data = store.get_product(url.path.rsplit('/', 1)[1])
+        elif url.path == '/global/json/getSkuJson.jsp':
+            data = store.get_skus([sku for sku in query.get('skuId', [''])[0].split(',') if sku])
+        else:
+            data = None
+        if data is None:
+            return self.send_body(404, '')
+        self.send_body(200, json.dumps(data))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        if urlparse(self.path).path != '/products/':
+            return self.send_body(404, '')
+        if self.server.upload_latency:
+            time.sleep(self.server.upload_latency)
+        try:
+            product = json.loads(body.decode('utf-8'))
+        except ValueError:
+            return self.send_body(400, '')
+        # injected failures, drawn before the duplicate check so they hit new products too
+        draw = self.server.random.random()
+        if draw < self.server.error_rate:
+            return self.send_body(503, '')
+        if draw < self.server.error_rate + self.server.conflict_rate:
+            return self.send_body(409, '')
+        status = self.server.store.upload(product)
+        self.send_body(status, json.dumps(product) if status == 201 else '')
+
+    def record(self):
+        response = requests.get('{upstream}{path}'.format(upstream=self.server.upstream,
+                                                         path=self.path))
+        if response.status_code == 200:
+            with self.server.store.lock:
+                self.server.store.cassette[self.path] = response.text
+        self.send_body(response.status_code, response.text)
+
+    def send_body(self, status, body):
+        encoded = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+
+class ReplayHTTPServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+    # the default backlog of 5 refuses connections under the upload load tests
+    request_queue_size = 128
+
+
+class ReplayServer:
+
+    def __init__(self, store, host='127.0.0.1', port=0, upstream=None, latency=0,
+                 upload_latency=0, conflict_rate=0, error_rate=0, seed=None):
+        self.store = store
+        self.httpd = ReplayHTTPServer((host, port), ReplayHandler)
+        self.httpd.store = store
+        self.httpd.upstream = upstream
+        self.httpd.latency = latency
+        self.httpd.upload_latency = upload_latency
+        self.httpd.conflict_rate = conflict_rate
+        self.httpd.error_rate = error_rate
+        self.httpd.random = random.Random(seed)
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return 'http://{host}:{port}'.format(host=host, port=port)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve recorded Sephora responses locally')
+    parser.add_argument('--data-path', default=os.path.join(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), 'data'))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0,
+                        help='delay added to every GET to mimic the network round trip')
+    parser.add_argument('--upload-latency-ms', type=float, default=0,
+                        help='delay added to every POST /products/')
+    parser.add_argument('--conflict-rate', type=float, default=0,
+                        help='fraction of uploads answered 409 regardless of duplicates')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='fraction of uploads answered 503')
+    parser.add_argument('--seed', type=int, help='seed for the injected upload failures')
+    parser.add_argument('--cassette', help='json file of recorded responses to replay')
+    parser.add_argument('--record', metavar='UPSTREAM',
+                        help='forward GETs to UPSTREAM (e.g. http://www.sephora.com) '
+                             'and save the responses to --cassette')
+    args = parser.parse_args()
+
+    store = ReplayStore.from_dumps(args.data_path)
+    if args.cassette:
+        store.load_cassette(args.cassette)
+    server = ReplayServer(store, args.host, args.port, upstream=args.record,
+                          latency=args.latency_ms / 1000.0,
+                          upload_latency=args.upload_latency_ms / 1000.0,
+                          conflict_rate=args.conflict_rate, error_rate=args.error_rate, seed=args.seed)
+    print('serving', len(store.categories), 'categories,', len(store.skus), 'skus on', server.url)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        if args.record and args.cassette:
+            store.save_cassette(args.cassette)
+
+
+if __name__ == '__main__':
+    main()
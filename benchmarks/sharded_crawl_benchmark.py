@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Runs the sharded crawl with local worker processes against the replay server
+import argparse
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('KISS_AND_MAKEUP_ROOT', ROOT_PATH)
+sys.path.insert(0, ROOT_PATH)
+
+from benchmarks.pipeline_benchmark import get_work_path, redirect_scraper, select_categories
+from benchmarks.replay_server import ReplayServer, ReplayStore
+
+
+def run(workers, limit=None, kill_after=None, lease_seconds=5, latency=0.02):
+    from workflows.sephora_scraper_static import ProductScraper
+    from workflows.sharded_crawl import ShardedCrawl
+
+    store = ReplayStore.from_dumps(os.path.join(ROOT_PATH, 'data'))
+    work_path = get_work_path()
+    with ReplayServer(store, latency=latency) as server:
+        crawl = ShardedCrawl(queue_path=os.path.join(work_path, 'queue.sqlite'),
+                             lease_seconds=lease_seconds)
+        crawl.scraper = redirect_scraper(ProductScraper(), server.url, work_path)
+        crawl.POLL_SECONDS = 0.1
+        crawl.seed(select_categories(crawl.scraper, store, limit=limit))
+
+        start = time.perf_counter()
+        processes = [multiprocessing.Process(target=crawl.run_worker) for _ in range(workers)]
+        for process in processes:
+            process.start()
+        if kill_after is not None:
+            # a crashed worker's leases expire and the others pick the tasks up
+            time.sleep(kill_after)
+            os.kill(processes[0].pid, signal.SIGKILL)
+            print('killed worker', processes[0].pid)
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+    skus = [name for name in os.listdir(os.path.join(work_path, 'skus')) if name.endswith('.json')]
+    print('workers {}: {:.2f}s, {} sku files, tasks {}'.format(
+        workers, elapsed, len(skus), crawl.queue.counts()))
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the sharded crawl with local processes')
+    parser.add_argument('--workers', type=int, action='append',
+                        help='worker process counts to try (repeatable), default 1, 2 and 4')
+    parser.add_argument('--limit', type=int, help='only crawl the first N categories')
+    parser.add_argument('--kill-after', type=float,
+                        help='SIGKILL one worker after this many seconds to exercise lease recovery')
+    parser.add_argument('--lease-seconds', type=float, default=5)
+    parser.add_argument('--latency-ms', type=float, default=20,
+                        help='simulated round trip for every replayed request')
+    args = parser.parse_args()
+
+    for workers in args.workers or [1, 2, 4]:
+        run(workers, args.limit, args.kill_after, args.lease_seconds, args.latency_ms / 1000.0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Resident size of the sku dumps parsed as dicts versus SkuRecords
+import argparse
+import gc
+import glob
+import json
+import os
+import sys
+import tracemalloc
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from workflows.sku_record import loads_skus
+
+
+def measure(texts, parse):
+    gc.collect()
+    tracemalloc.start()
+    parsed = [parse(text) for text in texts]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    count = sum(len(data) for data in parsed)
+    del parsed
+    return size, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare memory held by parsed sku dumps')
+    parser.add_argument('paths', nargs='*',
+                        default=sorted(glob.glob(os.path.join(ROOT_PATH, 'data', 'skus*', '*.json'))))
+    args = parser.parse_args()
+
+    texts = list()
+    for path in args.paths:
+        with open(path, encoding='utf-8') as dump:
+            texts.append(dump.read())
+
+    parsers = (('dict', json.loads),
+               ('SkuRecord', loads_skus),
+               ('SkuRecord+raw', lambda text: loads_skus(text, keep_raw=True)))
+    baseline = None
+    print('{:<14} {:>8} {:>12} {:>12} {:>9}'.format('parser', 'skus', 'bytes', 'bytes/sku', 'vs dict'))
+    for name, parse in parsers:
+        size, count = measure(texts, parse)
+        baseline = baseline or size
+        print('{:<14} {:>8} {:>12} {:>12.0f} {:>9.0%}'.format(
+            name, count, size, size / float(count or 1), size / float(baseline)))
+
+
+if __name__ == '__main__':
+    main()
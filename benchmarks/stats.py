@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Timing helpers shared by the benchmark scripts
+import functools
+import math
+import threading
+import time
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    if low == high:
+        return ordered[int(rank)]
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def count_items(result):
+    if result is None:
+        return 0
+    if isinstance(result, int):
+        return result
+    if isinstance(result, dict) and 'products' in result:
+        return len(result['products'])
+    if isinstance(result, (dict, list)):
+        return len(result)
+    return 1
+
+
+class StageTimer:
+
+    def __init__(self):
+        self.stages = dict()
+        self.lock = threading.Lock()
+
+    def record(self, stage, duration, items=1):
+        with self.lock:
+            stats = self.stages.setdefault(stage, {'durations': list(),
+                                                   'items': 0})
+            stats['durations'].append(duration)
+            stats['items'] += items
+
+    def wrap(self, instance, method_name, stage, items=None):
+        method = getattr(instance, method_name)
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            result = method(*args, **kwargs)
+            self.record(stage,
+                        time.perf_counter() - start,
+                        items(result) if items else 1)
+            return result
+
+        setattr(instance, method_name, timed)
+        return timed
+
+    def summary(self):
+        summary = dict()
+        for stage, stats in self.stages.items():
+            durations = stats['durations']
+            total = sum(durations)
+            summary[stage] = {
+                'calls': len(durations),
+                'items': stats['items'],
+                'seconds': total,
+                'items_per_second': stats['items'] / total if total else None,
+                'p50_ms': percentile(durations, 50) * 1000,
+                'p90_ms': percentile(durations, 90) * 1000,
+                'p99_ms': percentile(durations, 99) * 1000,
+            }
+        return summary
+
+
+def format_summary(summary):
+    lines = ['{:<12} {:>7} {:>8} {:>9} {:>10} {:>9} {:>9} {:>9}'.format(
+        'stage', 'calls', 'items', 'seconds', 'items/s', 'p50 ms', 'p90 ms', 'p99 ms')]
+    for stage, stats in summary.items():
+        lines.append('{:<12} {:>7} {:>8} {:>9.3f} {:>10.1f} {:>9.2f} {:>9.2f} {:>9.2f}'.format(
+            stage,
+            stats['calls'],
+            stats['items'],
+            stats['seconds'],
+            stats['items_per_second'] or 0,
+            stats['p50_ms'],
+            stats['p90_ms'],
+            stats['p99_ms']))
+    return '\n'.join(lines)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Load test of SephoraLoader.post_product_data at increasing concurrency
+#
+# Replays products transformed from the data/skus* dumps against --target,
+# or against the replay server's /products/ sink when no target is given.
+# 409 means the product already exists and counts as handled, like the loader
+# treats it; 5xx and connection failures count as errors.
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('KISS_AND_MAKEUP_ROOT', ROOT_PATH)
+sys.path.insert(0, ROOT_PATH)
+
+from benchmarks.replay_server import ReplayServer, ReplayStore
+from benchmarks.stats import percentile
+
+DEFAULT_CONCURRENCY = (1, 2, 4, 8, 16, 32)
+
+
+def get_products(loader, paths, limit=None):
+    # the dumps overlap, so keep each sku once to leave 409s to the target
+    products, seen = list(), set()
+    for path in paths:
+        for sku in loader.read_products_data(path).values():
+            transformed = loader.transform_product_data(sku)
+            if transformed and transformed['skus']['sephora'] not in seen:
+                seen.add(transformed['skus']['sephora'])
+                products.append(transformed)
+            if limit and len(products) >= limit:
+                return products
+    return products
+
+
+def post(loader, product):
+    start = time.perf_counter()
+    status = loader.post_product_data(product)
+    return status, time.perf_counter() - start
+
+
+def run_level(loader, products, concurrency):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda product: post(loader, product), products))
+    seconds = time.perf_counter() - start
+    latencies = [latency for _, latency in results]
+    statuses = [status for status, _ in results]
+    errors = sum(1 for status in statuses if status is None or status >= 500)
+    return {'concurrency': concurrency,
+            'requests': len(results),
+            'seconds': seconds,
+            'requests_per_second': len(results) / seconds if seconds else None,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p90_ms': percentile(latencies, 90) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'created': statuses.count(201),
+            'conflicts': statuses.count(409),
+            'errors': errors,
+            'error_rate': errors / float(len(results) or 1),
+            'other': len(results) - statuses.count(201) - statuses.count(409) - errors}
+
+
+def sweep(loader, products, levels, max_error_rate=None, before_level=None):
+    reports = list()
+    for concurrency in levels:
+        if before_level:
+            before_level()
+        report = run_level(loader, products, concurrency)
+        reports.append(report)
+        print(format_report(report))
+        if max_error_rate is not None and report['error_rate'] > max_error_rate:
+            print('stopping: error rate {:.1%} over {:.1%}'.format(report['error_rate'], max_error_rate))
+            break
+    return reports
+
+
+def format_header():
+    return '{:>5} {:>8} {:>8} {:>9} {:>9} {:>9} {:>9} {:>8} {:>8} {:>8}'.format(
+        'conc', 'requests', 'seconds', 'req/s', 'p50 ms', 'p90 ms', 'p99 ms', '201', '409', 'errors')
+
+
+def format_report(report):
+    return '{:>5} {:>8} {:>8.2f} {:>9.1f} {:>9.2f} {:>9.2f} {:>9.2f} {:>8} {:>8} {:>7.1%}'.format(
+        report['concurrency'], report['requests'], report['seconds'], report['requests_per_second'] or 0,
+        report['p50_ms'], report['p90_ms'], report['p99_ms'],
+        report['created'], report['conflicts'], report['error_rate'])
+
+
+def main():
+    from workflows.sephora_loader import SephoraLoader
+
+    parser = argparse.ArgumentParser(description='Sweep upload concurrency against the product API')
+    parser.add_argument('--target', help='API root to post to, e.g. http://localhost:8000; '
+                                         'defaults to a local replay server')
+    parser.add_argument('--concurrency', type=int, action='append',
+                        help='concurrent uploads for one level (repeatable), '
+                             'defaults to {}'.format(', '.join(map(str, DEFAULT_CONCURRENCY))))
+    parser.add_argument('--limit', type=int, default=2000, help='products posted per level')
+    parser.add_argument('--max-error-rate', type=float,
+                        help='stop the sweep after a level with a higher error rate')
+    parser.add_argument('--upload-latency-ms', type=float, default=20,
+                        help='local server: delay per upload')
+    parser.add_argument('--conflict-rate', type=float, default=0, help='local server: fraction answered 409')
+    parser.add_argument('--error-rate', type=float, default=0, help='local server: fraction answered 503')
+    parser.add_argument('--seed', type=int, default=0, help='local server: seed for injected failures')
+    parser.add_argument('--output', help='write the per-level reports to this json file')
+    parser.add_argument('paths', nargs='*',
+                        default=sorted(glob.glob(os.path.join(ROOT_PATH, 'data', 'skus*', '*.json'))))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    loader = SephoraLoader()
+    products = get_products(loader, args.paths, args.limit)
+    levels = args.concurrency or DEFAULT_CONCURRENCY
+    print('posting', len(products), 'products per level')
+
+    if args.target:
+        loader.API_URL = args.target.rstrip('/')
+        print(format_header())
+        reports = sweep(loader, products, levels, args.max_error_rate)
+    else:
+        store = ReplayStore()
+        with ReplayServer(store, upload_latency=args.upload_latency_ms / 1000.0,
+                          conflict_rate=args.conflict_rate, error_rate=args.error_rate,
+                          seed=args.seed) as server:
+            loader.API_URL = server.url
+            print(format_header())
+            # every level posts the same products, so start each one with an empty sink
+            reports = sweep(loader, products, levels, args.max_error_rate, before_level=store.clear_uploads)
+
+    peak = max(reports, key=lambda report: report['requests_per_second'] or 0)
+    print('peak {:.1f} req/s at concurrency {}'.format(peak['requests_per_second'], peak['concurrency']))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(reports, output, sort_keys=True, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# JSON encoding and decoding for every file and response the workflows touch
+#
+# Uses orjson or ujson when installed and the stdlib json module otherwise.
+# Set KISS_AND_MAKEUP_JSON to orjson, ujson or json to pick one. Pretty
+# output is byte for byte what json.dump(sort_keys=True, indent=4) writes,
+# \u escapes and float formatting included, so dumps diff cleanly whichever
+# backend wrote them (orjson writes NaN and infinities as null, which the
+# stdlib would write as invalid JSON). pretty=False writes compact JSON, in
+# UTF-8 rather than \u escapes, for files only the workflows read (errors,
+# mappings, crawl costs, queue payloads, the catalog snapshot).
+import codecs
+import importlib
+import json
+import os
+import re
+
+BACKEND_ENV = 'KISS_AND_MAKEUP_JSON'
+BACKENDS = ('orjson', 'ujson', 'json')
+INDENT = 4
+# in indented output every number is alone on its line, after any key;
+# EXPONENT finds the floats a backend may format unlike repr() quickly
+FLOAT = re.compile(rb'^( *(?:"(?:[^"\\\n]|\\.)*": )?)(-?\d+(?:\.\d+)?e[-+]?\d+|-?0\.0000\d*)(?=,?$)', re.M)
+EXPONENT = re.compile(rb'e[-+]?\d+,?(?:\n|$)')
+
+
+class StdlibBackend:
+
+    name = 'json'
+
+    def loads(self, text, object_hook=None):
+        return json.loads(text, object_hook=object_hook)
+
+    def dumps(self, value, pretty=True, default=None):
+        if pretty:
+            return json.dumps(value, sort_keys=True, indent=INDENT, default=default)
+        return json.dumps(value, separators=(',', ':'), default=default)
+
+    def dumpb(self, value, pretty=True, default=None):
+        return self.dumps(value, pretty, default).encode('utf-8')
+
+
+class UjsonBackend(StdlibBackend):
+
+    name = 'ujson'
+
+    def __init__(self, module):
+        self.module = module
+
+    def loads(self, text, object_hook=None):
+        if object_hook is not None:
+            # no object_hook here, and calling one from python after the fact
+            # is slower than the stdlib scanner calling it
+            return json.loads(text, object_hook=object_hook)
+        return self.module.loads(text)
+
+    def dumps(self, value, pretty=True, default=None):
+        encoded = self.module.dumps(value, sort_keys=pretty, indent=INDENT if pretty else 0,
+                                    escape_forward_slashes=False, default=default)
+        return to_stdlib_layout(encoded).decode('ascii') if pretty else encoded
+
+
+class OrjsonBackend(StdlibBackend):
+
+    name = 'orjson'
+
+    def __init__(self, module):
+        self.module = module
+        self.pretty = module.OPT_INDENT_2 | module.OPT_SORT_KEYS | module.OPT_NON_STR_KEYS
+
+    def loads(self, text, object_hook=None):
+        if object_hook is not None:
+            return json.loads(text, object_hook=object_hook)
+        return self.module.loads(text)
+
+    def dumps(self, value, pretty=True, default=None):
+        return self.dumpb(value, pretty, default).decode('utf-8')
+
+    def dumpb(self, value, pretty=True, default=None):
+        if not pretty:
+            return self.module.dumps(value, default=default, option=self.module.OPT_NON_STR_KEYS)
+        # orjson only indents by two, so double each line's leading spaces;
+        # newlines inside strings are escaped, so those are all indentation
+        lines = self.module.dumps(value, default=default, option=self.pretty).split(b'\n')
+        encoded = b'\n'.join([line[:len(line) - len(line.lstrip(b' '))] + line for line in lines])
+        return to_stdlib_layout(encoded if encoded.isascii() else encoded.decode('utf-8'))
+
+
+def escape_non_ascii(error):
+    return json.dumps(error.object[error.start:error.end])[1:-1], error.end
+
+
+codecs.register_error('json_escape', escape_non_ascii)
+
+
+def to_stdlib_layout(text):
+    # ensure_ascii's escapes, which only string contents can need, and
+    # repr()'s floats in place of the backend's; returns ASCII bytes
+    if isinstance(text, str):
+        text = text.encode('ascii', 'json_escape')
+    encoded = text.replace(b'\x7f', b'\\u007f')
+    if EXPONENT.search(encoded) or b'0.0000' in encoded:
+        encoded = FLOAT.sub(lambda match: match.group(1) + repr(float(match.group(2))).encode('ascii'), encoded)
+    return encoded
+
+
+def get_backend(name=None):
+    if name and name not in BACKENDS:
+        raise ValueError('unknown json backend {}, expected one of {}'.format(name, ', '.join(BACKENDS)))
+    for candidate in [name] if name else BACKENDS:
+        if candidate == 'json':
+            return StdlibBackend()
+        try:
+            module = importlib.import_module(candidate)
+        except ImportError:
+            if name:
+                raise
+            continue
+        return OrjsonBackend(module) if candidate == 'orjson' else UjsonBackend(module)
+
+
+_backend = None
+
+
+def set_backend(name=None):
+    global _backend
+    _backend = get_backend(name)
+    return _backend
+
+
+def get_current_backend():
+    if _backend is None:
+        set_backend(os.environ.get(BACKEND_ENV, None))
+    return _backend
+
+
+def loads(text, object_hook=None):
+    return get_current_backend().loads(text, object_hook)
+
+
+def dumps(value, pretty=True, default=None):
+    return get_current_backend().dumps(value, pretty, default)
+
+
+def dumpb(value, pretty=True, default=None):
+    return get_current_backend().dumpb(value, pretty, default)
+
+
+def load(infile, object_hook=None):
+    return loads(infile.read(), object_hook)
+
+
+def dump(value, outfile, pretty=True, default=None):
+    outfile.write(dumps(value, pretty, default))
+
+
+def loads_response(response):
+    # like requests' .json(), but through the configured backend
+    if response.encoding and codecs.lookup(response.encoding).name != 'utf-8':
+        return loads(response.text)
+    return loads(response.content)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Incremental JSON array reading and JSON object writing
+import codecs
+import json
+
+from utilities import json_codec
+
+WHITESPACE = ' \t\n\r'
+
+
+def iter_json_items(chunks, encoding='utf-8', object_hook=None):
+    # yields each element of a top level array as soon as it is complete;
+    # any other top level value is yielded once the stream ends
+    decoder = json.JSONDecoder(object_hook=object_hook)
+    text = codecs.getincrementaldecoder(encoding)(errors='replace')
+    state = {'buffer': '', 'is_array': None, 'done': False}
+    for chunk in chunks:
+        state['buffer'] += text.decode(chunk)
+        for item in drain(decoder, state, final=False):
+            yield item
+    state['buffer'] += text.decode(b'', final=True)
+    for item in drain(decoder, state, final=True):
+        yield item
+    if state['is_array'] is False:
+        yield decoder.decode(state['buffer'])
+    elif state['is_array'] and not state['done']:
+        raise ValueError('unterminated JSON array')
+
+
+def drain(decoder, state, final):
+    buffer = state['buffer']
+    if state['is_array'] is None:
+        buffer = buffer.lstrip(WHITESPACE)
+        if buffer:
+            state['is_array'] = buffer[0] == '['
+            if state['is_array']:
+                buffer = buffer[1:]
+    if not state['is_array'] or state['done']:
+        state['buffer'] = buffer
+        return
+    position = 0
+    while True:
+        while position < len(buffer) and buffer[position] in WHITESPACE + ',':
+            position += 1
+        if position == len(buffer):
+            break
+        if buffer[position] == ']':
+            state['done'] = True
+            break
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except ValueError:
+            if final:
+                raise
+            break
+        if not final and not isinstance(item, (dict, list)) and \
+                (end == len(buffer) or buffer[end] not in WHITESPACE + ',]'):
+            # a number at the end of the buffer may still be growing
+            break
+        position = end
+        yield item
+    state['buffer'] = buffer[position:]
+
+
+class JsonObjectWriter:
+    # writes {key: value, ...} one member at a time in json_codec.dump's layout
+
+    def __init__(self, outfile, pretty=True, default=None):
+        self.outfile = outfile
+        self.pretty = pretty
+        self.default = default
+        self.count = 0
+
+    def write(self, key, value):
+        encoded = json_codec.dumps(value, pretty=self.pretty, default=self.default)
+        if self.pretty:
+            padding = ' ' * json_codec.INDENT
+            member = '{separator}{padding}{key}: {value}'.format(
+                separator='{\n' if not self.count else ',\n',
+                padding=padding,
+                key=json_codec.dumps(str(key)),
+                value=encoded.replace('\n', '\n' + padding))
+        else:
+            member = '{separator}{key}:{value}'.format(
+                separator='{' if not self.count else ',',
+                key=json_codec.dumps(str(key)),
+                value=encoded)
+        self.outfile.write(member)
+        self.count += 1
+
+    def close(self):
+        if not self.count:
+            self.outfile.write('{}')
+        else:
+            self.outfile.write('\n}' if self.pretty else '}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Opt-in per-stage CPU and allocation profiling
+#
+# Set KISS_AND_MAKEUP_PROFILE to a directory (or pass --profile to
+# workflows.cli) before the workflow modules are imported. When the process
+# exits, each stage gets:
+#
+#   <stage>.<pid>.prof            cProfile stats (snakeviz, flameprof, tuna, gprof2dot)
+#   <stage>.<pid>.tracemalloc     tracemalloc snapshot at the stage's largest heap
+#   <stage>.<pid>.allocations.txt top allocation sites from that snapshot
+#
+# Nested stages are attributed exclusively: the outer stage's profiler is
+# paused while an inner stage runs. Without the variable @profiled returns
+# the function unchanged and profiled_iter the iterable, so disabled hooks
+# cost nothing.
+import atexit
+import cProfile
+import functools
+import logging
+import os
+import pstats
+import threading
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ENV = 'KISS_AND_MAKEUP_PROFILE'
+TRACEMALLOC_FRAMES = 10
+# snapshots are expensive, so only retake one when the heap has grown this much
+SNAPSHOT_GROWTH = 1.1
+# end of a profiled stream; streams may yield None
+_END = object()
+
+
+class StageProfiler:
+
+    def __init__(self, path):
+        self.path = path
+        self.profiles = dict()
+        self.peaks = dict()
+        self.snapshots = dict()
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        atexit.register(self.dump)
+
+    def get_stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = list()
+        return self.local.stack
+
+    def get_profile(self, stage):
+        key = (stage, threading.get_ident())
+        with self.lock:
+            if key not in self.profiles:
+                self.profiles[key] = cProfile.Profile()
+            return self.profiles[key]
+
+    def enable(self, profile):
+        try:
+            profile.enable()
+            return True
+        except ValueError:
+            # python 3.12+ allows one active profiler per process, so
+            # concurrent threads only record allocations
+            return False
+
+    def enter(self, stage):
+        stack = self.get_stack()
+        if stack and stack[-1][1]:
+            stack[-1][0].disable()
+        profile = self.get_profile(stage)
+        stack.append((profile, self.enable(profile)))
+
+    def exit(self, stage):
+        stack = self.get_stack()
+        profile, enabled = stack.pop()
+        if enabled:
+            profile.disable()
+        if stack and stack[-1][1]:
+            stack[-1] = (stack[-1][0], self.enable(stack[-1][0]))
+        self.record_allocations(stage)
+
+    def record_allocations(self, stage):
+        current = tracemalloc.get_traced_memory()[0]
+        with self.lock:
+            if current <= self.peaks.get(stage, 0) * SNAPSHOT_GROWTH:
+                return
+            self.peaks[stage] = current
+        snapshot = tracemalloc.take_snapshot()
+        with self.lock:
+            self.snapshots[stage] = snapshot
+
+    def dump(self):
+        pid = os.getpid()
+        stages = dict()
+        for (stage, _), profile in self.profiles.items():
+            stages.setdefault(stage, list()).append(profile)
+        for stage, profiles in stages.items():
+            try:
+                stats = pstats.Stats(profiles[0])
+                for profile in profiles[1:]:
+                    stats.add(profile)
+            except TypeError:
+                # a profile that never ran has no stats to merge
+                continue
+            stats.dump_stats(os.path.join(self.path, '{}.{}.prof'.format(stage, pid)))
+        for stage, snapshot in self.snapshots.items():
+            snapshot.dump(os.path.join(self.path, '{}.{}.tracemalloc'.format(stage, pid)))
+            with open(os.path.join(self.path, '{}.{}.allocations.txt'.format(stage, pid)), 'w',
+                      encoding='utf-8') as top:
+                top.write('traced bytes at snapshot {}\n'.format(self.peaks[stage]))
+                for statistic in snapshot.statistics('lineno')[:25]:
+                    top.write('{}\n'.format(statistic))
+        logger.info('wrote profiles for %s stages to %s', len(stages), self.path)
+
+
+_profiler = None
+
+
+def get_profiler():
+    global _profiler
+    if _profiler is None:
+        _profiler = StageProfiler(os.environ[PROFILE_ENV])
+    return _profiler
+
+
+def profiled(stage):
+    def decorator(function):
+        if not os.environ.get(PROFILE_ENV, None):
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            profiler = get_profiler()
+            profiler.enter(stage)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler.exit(stage)
+        return wrapper
+    return decorator
+
+
+def profiled_iter(stage, iterable):
+    # @profiled for the work done producing each item of a stream
+    if not os.environ.get(PROFILE_ENV, None):
+        return iterable
+    return _iter_profiled(stage, iter(iterable))
+
+
+def _iter_profiled(stage, iterator):
+    profiler = get_profiler()
+    while True:
+        profiler.enter(stage)
+        try:
+            item = next(iterator, _END)
+        finally:
+            profiler.exit(stage)
+        if item is _END:
+            return
+        yield item
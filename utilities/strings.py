@@ -4,8 +4,6 @@
 
 import re
 
-from bs4 import BeautifulSoup
-
 
 def remove_escape_characters(value):
     regex = re.compile(r'[\n\r\t]')
@@ -13,5 +11,7 @@ def remove_escape_characters(value):
 
 
 def remove_html_tags(value, parser):
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(value, parser)
     return soup.text
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Every installed backend writes pretty JSON byte for byte like the stdlib
+#
+#     python -m pytest utilities
+import json
+import unittest
+
+from utilities import json_codec
+
+VALUES = [
+    {'name': 'crème brûlée ✨', 'emoji': '😀', 'ä': {'del': '\x7f', 'control': '\x00\x1f\n\t'}},
+    {'floats': [1e20, 1e16, 1.5e300, 1e-05, 0.00012, 0.0001, 5e-324, -0.0, 0.1, 1234567.875]},
+    {'quoted': 'a": 1e20', 'key\\"": 1e20, "x': -1e-07, 'z': [[], {}, True, None]},
+    1e+22,
+    'ünïcode',
+]
+
+
+def get_backends():
+    for name in json_codec.BACKENDS:
+        try:
+            yield json_codec.get_backend(name)
+        except ImportError:
+            continue
+
+
+class PrettyOutputTest(unittest.TestCase):
+
+    def test_pretty_output_matches_json_dump(self):
+        for backend in get_backends():
+            for value in VALUES:
+                expected = json.dumps(value, sort_keys=True, indent=4)
+                with self.subTest(backend=backend.name, value=value):
+                    self.assertEqual(backend.dumps(value), expected)
+                    self.assertEqual(backend.dumpb(value), expected.encode('utf-8'))
+
+    def test_compact_output_round_trips(self):
+        for backend in get_backends():
+            for value in VALUES:
+                with self.subTest(backend=backend.name, value=value):
+                    self.assertEqual(json.loads(backend.dumps(value, pretty=False)), value)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Chunk boundary tests for utilities/json_stream.py
+#
+#     python -m pytest utilities
+import io
+import json
+import unittest
+
+from utilities.json_stream import JsonObjectWriter, iter_json_items
+
+
+def chunked(encoded, size):
+    return [encoded[start:start + size] for start in range(0, len(encoded), size)]
+
+
+class IterJsonItemsTest(unittest.TestCase):
+
+    def assert_items(self, text, expected, sizes=(1, 2, 3, 5, 7, 64, 100000), **kwargs):
+        encoded = text.encode('utf-8')
+        for size in sizes:
+            with self.subTest(size=size):
+                self.assertEqual(list(iter_json_items(chunked(encoded, size), **kwargs)), expected)
+
+    def test_array_of_objects(self):
+        items = [{'sku_number': str(n), 'list_price': '${}.00'.format(n), 'images': ['a', 'b']}
+                 for n in range(20)]
+        self.assert_items(json.dumps(items, indent=4), items)
+
+    def test_number_at_the_end_of_a_buffer_is_not_cut_short(self):
+        self.assert_items('[3.25, 1e10, -17, 120000, 0]', [3.25, 1e10, -17, 120000, 0])
+
+    def test_literals_and_strings(self):
+        self.assert_items('[true, false, null, "a,]b", "esc\\"aped\\\\"]',
+                          [True, False, None, 'a,]b', 'esc"aped\\'])
+
+    def test_multibyte_characters_split_across_chunks(self):
+        self.assert_items('[{"name": "crème brûlée ✨"}]', [{'name': 'crème brûlée ✨'}])
+
+    def test_empty_array_and_whitespace(self):
+        self.assert_items('  \n[ \n ]  ', [])
+
+    def test_top_level_object_is_yielded_at_the_end(self):
+        self.assert_items('{"1": {"sku_number": "1"}}', [{'1': {'sku_number': '1'}}])
+
+    def test_top_level_scalar(self):
+        self.assert_items(' 42 ', [42])
+
+    def test_unterminated_array_raises(self):
+        for text in ('[1, 2', '[{"a": 1}, {"b"'):
+            for size in (1, 4, 100000):
+                with self.subTest(text=text, size=size):
+                    with self.assertRaises(ValueError):
+                        list(iter_json_items(chunked(text.encode('utf-8'), size)))
+
+    def test_items_arrive_before_the_stream_ends(self):
+        def chunks():
+            yield b'[{"a": 1}, '
+            raise AssertionError('read past the first item')
+        self.assertEqual(next(iter_json_items(chunks())), {'a': 1})
+
+    def test_object_hook_and_encoding(self):
+        text = '[{"name": "café"}]'
+        items = list(iter_json_items(chunked(text.encode('latin-1'), 3), encoding='latin-1',
+                                     object_hook=lambda data: sorted(data.items())))
+        self.assertEqual(items, [[('name', 'café')]])
+
+
+class JsonObjectWriterTest(unittest.TestCase):
+
+    def write(self, items, **kwargs):
+        outfile = io.StringIO()
+        with JsonObjectWriter(outfile, **kwargs) as writer:
+            for key, value in items.items():
+                writer.write(key, value)
+        return outfile.getvalue()
+
+    def test_pretty_output_matches_json_dump(self):
+        # members come out in write order, their values with sorted keys
+        items = {'1': {}, '2': {'b': [1, {'c': None}], 'a': 'x'}}
+        self.assertEqual(self.write(items), json.dumps(items, indent=4, sort_keys=True))
+
+    def test_compact_output_round_trips(self):
+        items = {'2': {'b': [1, 2]}, '1': 'x'}
+        self.assertEqual(json.loads(self.write(items, pretty=False)), items)
+
+    def test_empty(self):
+        self.assertEqual(self.write(dict()), '{}')
+        self.assertEqual(self.write(dict(), pretty=False), '{}')
+
+
+if __name__ == '__main__':
+    unittest.main()
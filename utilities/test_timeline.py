@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Rolling statistics and trends of utilities/timeline.py
+#
+#     python -m pytest utilities
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from utilities.timeline import TimelineScorer, read_timeline
+
+
+def get_dates(days, start='1990-01-01'):
+    return np.datetime64(start, 'D') + np.arange(days).astype('timedelta64[D]')
+
+
+class TimelineScorerTest(unittest.TestCase):
+
+    def test_constant_scores_have_no_spread_or_trend(self):
+        scorer = TimelineScorer(get_dates(20000), {'buzz_score': np.full(20000, 63.7)})
+        trend = scorer.trends(window=30)['buzz_score']
+        self.assertEqual((trend['mean'], trend['std'], trend['slope']), (63.7, 0.0, 0.0))
+        means, stds = scorer.rolling(7)
+        self.assertTrue(np.all(stds['buzz_score'][1:] == 0))
+        self.assertTrue(np.all(means['buzz_score'] == 63.7))
+
+    def test_trend_far_from_the_first_date(self):
+        days = np.arange(20000)
+        scores = 40 + 0.003 * days + np.where(days % 2, 0.5, -0.5)
+        scorer = TimelineScorer(get_dates(20000), {'buzz_score': scores})
+        trend = scorer.trends(window=30)['buzz_score']
+        window = scores[-30:]
+        self.assertAlmostEqual(trend['mean'], window.mean(), places=9)
+        self.assertAlmostEqual(trend['std'], window.std(), places=9)
+        # x*y still grows with the day number; 55 years in it is good to 1e-6
+        slope = np.polyfit(days[-30:], window, 1)[0]
+        self.assertAlmostEqual(trend['slope'], slope, delta=abs(slope) * 1e-6)
+
+    def test_rolling_matches_a_rescan(self):
+        rng = np.random.RandomState(0)
+        scores = rng.uniform(-100, 100, 400)
+        scores[rng.rand(400) < 0.2] = np.nan
+        scorer = TimelineScorer(get_dates(400), {'buzz_score': scores})
+        means, stds = scorer.rolling(7)
+        filled = scorer.get('buzz_score')
+        for end in range(2, 401):
+            window = filled[max(end - 7, 0):end]
+            self.assertAlmostEqual(means['buzz_score'][end - 1], window.mean(), places=9)
+            self.assertAlmostEqual(stds['buzz_score'][end - 1], window.std(), places=9)
+
+    def test_append_matches_building_at_once(self):
+        scores = np.linspace(10, 30, 50)
+        appended = TimelineScorer(get_dates(0), dict())
+        for date, score in zip(get_dates(50), scores):
+            appended.append({'date': str(date), 'buzz_score': score})
+        built = TimelineScorer(get_dates(50), {'buzz_score': scores})
+        for name in ('mean', 'std', 'slope'):
+            self.assertAlmostEqual(appended.trends(10)['buzz_score'][name], built.trends(10)['buzz_score'][name],
+                                   places=9)
+
+    def test_unsorted_dates_are_rejected(self):
+        with self.assertRaises(ValueError):
+            TimelineScorer(get_dates(3)[::-1], {'buzz_score': np.ones(3)})
+
+
+class ReadTimelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp(prefix='kiss_and_makeup_timeline_')
+        self.path = os.path.join(self.tmp_path, 'timeline.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+    def write(self, *rows):
+        with open(self.path, 'w', encoding='utf-8') as timeline:
+            timeline.write('date,buzz_score\n' + ''.join('{},{}\n'.format(*row) for row in rows))
+
+    def test_rows_are_sorted_by_date(self):
+        self.write(('2020-01-03', 3), ('2020-01-01', 1), ('2020-01-02', ''))
+        dates, columns = read_timeline(self.path)
+        self.assertEqual([str(date) for date in dates], ['2020-01-01', '2020-01-02', '2020-01-03'])
+        self.assertEqual(columns['buzz_score'][[0, 2]].tolist(), [1.0, 3.0])
+        self.assertTrue(np.isnan(columns['buzz_score'][1]))
+
+    def test_repeated_dates_are_rejected(self):
+        self.write(('2020-01-02', 2), ('2020-01-01', 1), ('2020-01-02', 3))
+        with self.assertRaisesRegex(ValueError, '2020-01-02'):
+            read_timeline(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
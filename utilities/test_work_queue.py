@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Multi-process tests for utilities/work_queue.py against a temporary queue
+#
+#     python -m pytest utilities
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from utilities.work_queue import FileLock, WorkQueue, get_identity
+
+LEASE_SECONDS = 0.3
+
+
+def lease_and_die(path):
+    # a worker killed while holding a lease never completes or fails it
+    WorkQueue(path, lease_seconds=LEASE_SECONDS).lease('dead worker')
+    os._exit(1)
+
+
+def lease_and_complete(path, owner):
+    queue = WorkQueue(path, lease_seconds=LEASE_SECONDS)
+    task = queue.lease(owner)
+    if task is not None:
+        queue.complete(task, owner)
+    os._exit(0 if task is not None else 2)
+
+
+def drain(path, owner, results):
+    queue = WorkQueue(path, lease_seconds=60)
+    done = list()
+    while True:
+        task = queue.lease(owner)
+        if task is None:
+            break
+        if queue.complete(task, owner):
+            done.append(task.key)
+    results.put(done)
+
+
+class WorkQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp(prefix='kiss_and_makeup_queue_')
+        self.path = os.path.join(self.tmp_path, 'queue.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+    def get_queue(self, **kwargs):
+        kwargs.setdefault('lease_seconds', LEASE_SECONDS)
+        return WorkQueue(self.path, **kwargs)
+
+    def run_process(self, target, *args):
+        process = multiprocessing.Process(target=target, args=(self.path,) + args)
+        process.start()
+        process.join(30)
+        return process.exitcode
+
+    def get_row(self, key, *columns):
+        with self.get_queue().connect() as connection:
+            return connection.execute('SELECT {} FROM tasks WHERE key = ?'.format(', '.join(columns)),
+                                      (key,)).fetchone()
+
+    def test_expired_lease_is_leased_again(self):
+        queue = self.get_queue()
+        queue.put('skus', 'a', {'chunk': 0})
+        self.assertEqual(self.run_process(lease_and_die), 1)
+        self.assertIsNone(queue.lease('worker'))
+        time.sleep(LEASE_SECONDS * 2)
+        task = queue.lease('worker')
+        self.assertEqual((task.key, task.payload, task.attempts), ('a', {'chunk': 0}, 2))
+        # the dead worker's lease is gone, only the new owner can finish it
+        self.assertFalse(queue.complete(task, 'dead worker'))
+        self.assertTrue(queue.complete(task, 'worker'))
+        self.assertEqual(queue.counts(), {'skus': {'done': 1}})
+
+    def test_wait_for_holds_a_task_until_its_children_finish(self):
+        queue = self.get_queue()
+        queue.put('merge', 'merge:blush', dict(), priority=10, wait_for='blush')
+        queue.put('skus', 'blush:0000', dict(), parent='blush')
+        queue.put('skus', 'blush:0001', dict(), parent='blush')
+        self.assertEqual(self.run_process(lease_and_complete, 'one'), 0)
+        self.assertEqual(queue.child_counts('blush'), {'done': 1, 'pending': 1})
+        task = queue.lease('worker')
+        self.assertEqual(task.key, 'blush:0001')
+        # leased is not finished either
+        self.assertIsNone(queue.lease('worker'))
+        queue.fail(task, 'worker', 'boom')
+        self.assertEqual(self.run_process(lease_and_complete, 'two'), 0)
+        self.assertEqual(queue.lease('worker').key, 'merge:blush')
+
+    def test_failed_children_release_the_waiting_task(self):
+        queue = self.get_queue(max_attempts=1)
+        queue.put('merge', 'merge:blush', dict(), wait_for='blush')
+        queue.put('skus', 'blush:0000', dict(), parent='blush', priority=1)
+        queue.fail(queue.lease('worker'), 'worker', 'boom')
+        self.assertEqual(queue.child_counts('blush'), {'failed': 1})
+        self.assertEqual(queue.lease('worker').key, 'merge:blush')
+
+    def test_max_attempts_after_errors(self):
+        queue = self.get_queue(max_attempts=2)
+        queue.put('skus', 'a', dict())
+        for attempt in (1, 2):
+            task = queue.lease('worker')
+            self.assertEqual(task.attempts, attempt)
+            self.assertTrue(queue.fail(task, 'worker', 'connection refused'))
+        self.assertIsNone(queue.lease('worker'))
+        self.assertTrue(queue.is_finished())
+        self.assertEqual(self.get_row('a', 'state', 'attempts', 'error'), ('failed', 2, 'connection refused'))
+
+    def test_fail_without_retry(self):
+        queue = self.get_queue(max_attempts=3)
+        queue.put('merge', 'a', dict())
+        self.assertTrue(queue.fail(queue.lease('worker'), 'worker', 'chunk failed', retry=False))
+        self.assertIsNone(queue.lease('worker'))
+        self.assertEqual(self.get_row('a', 'state', 'attempts'), ('failed', 1))
+
+    def test_max_attempts_after_expired_leases(self):
+        queue = self.get_queue(max_attempts=2)
+        queue.put('skus', 'a', dict())
+        for _ in range(2):
+            self.assertEqual(self.run_process(lease_and_die), 1)
+            time.sleep(LEASE_SECONDS * 2)
+        self.assertIsNone(queue.lease('worker'))
+        self.assertEqual(self.get_row('a', 'state', 'attempts', 'error'), ('failed', 2, 'lease expired'))
+
+    def test_concurrent_workers_finish_each_task_once(self):
+        queue = self.get_queue()
+        keys = ['task:{:03d}'.format(n) for n in range(60)]
+        for key in keys:
+            queue.put('skus', key, dict())
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=drain, args=(self.path, 'worker {}'.format(n), results))
+                     for n in range(4)]
+        for process in processes:
+            process.start()
+        done = [key for _ in processes for key in results.get(timeout=60)]
+        for process in processes:
+            process.join(30)
+        self.assertEqual(sorted(done), keys)
+        self.assertEqual(queue.counts(), {'skus': {'done': 60}})
+        self.assertEqual(sorted(os.listdir(self.tmp_path)), ['queue.sqlite'])
+
+
+class FileLockTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp(prefix='kiss_and_makeup_lock_')
+        self.path = os.path.join(self.tmp_path, 'queue.sqlite.mutex')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+    def age(self):
+        os.utime(self.path, (0, 0))
+
+    def test_release_leaves_a_lock_taken_after_ours_was_broken(self):
+        lock = FileLock(self.path)
+        token = lock.acquire()
+        self.age()
+        other = lock.acquire()
+        self.assertNotEqual(other, token)
+        lock.release(token)
+        self.assertEqual(get_identity(os.stat(self.path)), other)
+        lock.release(other)
+        self.assertEqual(os.listdir(self.tmp_path), list())
+
+    def test_break_stale_puts_back_a_lock_taken_since(self):
+        lock = FileLock(self.path)
+        lock.acquire()
+        self.age()
+        rename = os.rename
+        taken = list()
+
+        def take_then_rename(source, destination):
+            # another waiter broke the stale lock and took a fresh one first
+            os.unlink(self.path)
+            taken.append(lock.acquire())
+            rename(source, destination)
+
+        with mock.patch('utilities.work_queue.os.rename', take_then_rename):
+            lock.break_stale(time.time())
+        self.assertEqual(get_identity(os.stat(self.path)), taken[0])
+        self.assertEqual(os.listdir(self.tmp_path), ['queue.sqlite.mutex'])
+
+    def test_fresh_lock_is_not_broken(self):
+        lock = FileLock(self.path)
+        token = lock.acquire()
+        lock.break_stale(os.stat(self.path).st_mtime + 1)
+        self.assertEqual(get_identity(os.stat(self.path)), token)
+
+
+if __name__ == '__main__':
+    unittest.main()
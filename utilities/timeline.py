@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Columnar scoring of the daily brand-tracking metrics in timeline.csv
+#
+# Sentiment metrics:  score = (positive - negative) / volume * 100
+# Yes/no metrics:     score = yes / volume * 100
+# Missing volumes are derived from the answer columns, and index_score /
+# index_volume are the mean score and total volume of the metrics with data
+# that day.
+import csv
+
+import numpy as np
+
+SENTIMENT_METRICS = ('buzz', 'impression', 'quality', 'value',
+                     'reputation', 'satisfaction', 'recommend')
+BINARY_METRICS = ('aided', 'attention', 'adaware', 'wom',
+                  'consider', 'likelybuy', 'current_own', 'former_own')
+SENTIMENT_FIELDS = ('positive', 'negative', 'neutral', 'unaware', 'score', 'volume')
+BINARY_FIELDS = ('yes', 'no', 'score', 'volume')
+
+
+def get_columns():
+    columns = ['index_score', 'index_volume']
+    for metric in SENTIMENT_METRICS:
+        columns.extend('{}_{}'.format(metric, field) for field in SENTIMENT_FIELDS)
+    for metric in BINARY_METRICS:
+        columns.extend('{}_{}'.format(metric, field) for field in BINARY_FIELDS)
+    return columns
+
+
+def parse_value(value):
+    if value is None or value == '':
+        return np.nan
+    return float(value)
+
+
+def read_timeline(path):
+    # rows may come in any order, but only once per date
+    with open(path, encoding='utf-8') as timeline:
+        reader = csv.reader(timeline)
+        header = next(reader)
+        rows = [row for row in reader if row]
+    dates = np.array([row[0] for row in rows], dtype='datetime64[D]')
+    order = np.argsort(dates, kind='stable')
+    repeated = dates[order][1:][np.diff(dates[order]) == np.timedelta64(0, 'D')]
+    if len(repeated):
+        raise ValueError('{} has more than one row for {}'.format(path, repeated[0]))
+    rows, dates = [rows[i] for i in order], dates[order]
+    columns = {name: np.array([parse_value(row[i]) if i < len(row) else np.nan for row in rows])
+               for i, name in enumerate(header) if i > 0}
+    return dates, columns
+
+
+def forward_fill(values, groups):
+    # carry each metric's last observed day forward over days with no data for it
+    observed = np.stack([~np.isnan(values[:, group]).all(axis=1) for group in groups], axis=1)
+    rows = np.arange(values.shape[0])[:, None]
+    index = np.maximum.accumulate(np.where(observed, rows, 0), axis=0)
+    column_groups = np.full(values.shape[1], -1)
+    for i, group in enumerate(groups):
+        column_groups[group] = i
+    index = np.where(column_groups >= 0, index[:, column_groups], rows)
+    return values[index, np.arange(values.shape[1])]
+
+
+class TimelineScorer:
+
+    def __init__(self, dates, columns, capacity=None):
+        self.columns = get_columns()
+        self.positions = {name: i for i, name in enumerate(self.columns)}
+        self.sentiment = {field: [self.positions['{}_{}'.format(m, field)] for m in SENTIMENT_METRICS]
+                          for field in SENTIMENT_FIELDS}
+        self.binary = {field: [self.positions['{}_{}'.format(m, field)] for m in BINARY_METRICS]
+                       for field in BINARY_FIELDS}
+        self.score_columns = (['index_score'] +
+                              ['{}_score'.format(m) for m in SENTIMENT_METRICS + BINARY_METRICS])
+        self.score_positions = [self.positions[name] for name in self.score_columns]
+        self.groups = ([[self.positions['{}_{}'.format(m, f)] for f in SENTIMENT_FIELDS] for m in SENTIMENT_METRICS] +
+                       [[self.positions['{}_{}'.format(m, f)] for f in BINARY_FIELDS] for m in BINARY_METRICS])
+
+        self.start = dates[0] if len(dates) else None
+        days = (dates - self.start).astype(int) if len(dates) else np.zeros(0, dtype=int)
+        if np.any(np.diff(days) <= 0):
+            raise ValueError('timeline dates must be sorted and unique')
+        self.size = int(days[-1]) + 1 if len(days) else 0
+        capacity = max(capacity or 0, self.size, 16)
+
+        self.values = np.full((capacity, len(self.columns)), np.nan)
+        for name, column in columns.items():
+            if name in self.positions:
+                self.values[days, self.positions[name]] = column
+        # running sums over the score columns of n, x, x*x, y, y*y and x*y, so
+        # windows and trends never rescan the history. x counts days from the
+        # first date and y is the score less the column's first score, which
+        # keeps the sums small enough that differencing them stays exact
+        # for flat stretches
+        self.sums = np.zeros((capacity + 1, 6, len(self.score_positions)))
+        self.shift = np.full(len(self.score_positions), np.nan)
+        self.fill(0, self.size)
+
+    @classmethod
+    def from_csv(cls, path):
+        dates, columns = read_timeline(path)
+        return cls(dates, columns)
+
+    @property
+    def dates(self):
+        return self.start + np.arange(self.size).astype('timedelta64[D]')
+
+    def fill(self, begin, end):
+        if begin == end:
+            return
+        seed = max(begin - 1, 0)
+        block = self.values[seed:end]
+        block[:] = forward_fill(block, self.groups)
+        self.score(block[begin - seed:])
+        self.accumulate(begin, end)
+
+    def score(self, block):
+        sentiment = {field: block[:, index] for field, index in self.sentiment.items()}
+        volume = np.where(np.isnan(sentiment['volume']),
+                          sentiment['positive'] + sentiment['negative'] + sentiment['neutral'],
+                          sentiment['volume'])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            score = np.where(volume > 0, (sentiment['positive'] - sentiment['negative']) / volume * 100, np.nan)
+        block[:, self.sentiment['volume']] = volume
+        block[:, self.sentiment['score']] = np.where(np.isnan(score), sentiment['score'], score)
+
+        binary = {field: block[:, index] for field, index in self.binary.items()}
+        volume = np.where(np.isnan(binary['volume']), binary['yes'] + binary['no'], binary['volume'])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            score = np.where(volume > 0, binary['yes'] / volume * 100, np.nan)
+        block[:, self.binary['volume']] = volume
+        block[:, self.binary['score']] = np.where(np.isnan(score), binary['score'], score)
+
+        scores = block[:, self.sentiment['score'] + self.binary['score']]
+        volumes = block[:, self.sentiment['volume'] + self.binary['volume']]
+        observed = (~np.isnan(scores)).sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            block[:, self.positions['index_score']] = np.where(
+                observed > 0, np.nansum(scores, axis=1) / observed, np.nan)
+        block[:, self.positions['index_volume']] = np.where(
+            (~np.isnan(volumes)).any(axis=1), np.nansum(volumes, axis=1), np.nan)
+
+    def accumulate(self, begin, end):
+        y = self.values[begin:end][:, self.score_positions]
+        mask = ~np.isnan(y)
+        unset = np.flatnonzero(np.isnan(self.shift) & mask.any(axis=0))
+        self.shift[unset] = y[mask[:, unset].argmax(axis=0), unset]
+        y = np.where(mask, y - self.shift, 0.0)
+        x = np.where(mask, np.arange(begin, end, dtype=float)[:, None], 0.0)
+        steps = np.stack([mask.astype(float), x, x * x, y, y * y, x * y], axis=1)
+        self.sums[begin + 1:end + 1] = self.sums[begin] + np.cumsum(steps, axis=0)
+
+    def grow(self, size):
+        capacity = self.values.shape[0]
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        values = np.full((capacity, len(self.columns)), np.nan)
+        values[:self.size] = self.values[:self.size]
+        sums = np.zeros((capacity + 1, 6, len(self.score_positions)))
+        sums[:self.size + 1] = self.sums[:self.size + 1]
+        self.values, self.sums = values, sums
+
+    def append(self, row):
+        date = np.datetime64(row['date'], 'D')
+        if self.start is None:
+            self.start = date
+        day = int((date - self.start).astype(int))
+        if day < self.size - 1:
+            raise ValueError('{} is before the last timeline date'.format(row['date']))
+        begin = min(day, self.size)
+        self.grow(day + 1)
+        self.values[day] = np.nan
+        for name, value in row.items():
+            if name in self.positions:
+                self.values[day, self.positions[name]] = parse_value(value)
+        self.size = day + 1
+        self.fill(begin, self.size)
+
+    def get(self, column):
+        return self.values[:self.size, self.positions[column]]
+
+    def rolling(self, window):
+        ends = np.arange(1, self.size + 1)
+        starts = np.maximum(ends - window, 0)
+        totals = self.sums[ends] - self.sums[starts]
+        count, y, yy = totals[:, 0], totals[:, 3], totals[:, 4]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.where(count > 0, self.shift + y / count, np.nan)
+            std = np.where(count > 1, np.sqrt(np.maximum((yy - y * y / count) / count, 0)), np.nan)
+        return ({name: mean[:, i] for i, name in enumerate(self.score_columns)},
+                {name: std[:, i] for i, name in enumerate(self.score_columns)})
+
+    def trends(self, window=None):
+        end = self.size
+        begin = max(end - window, 0) if window else 0
+        count, x, xx, y, yy, xy = self.sums[end] - self.sums[begin]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = self.shift + y / count
+            std = np.sqrt(np.maximum((yy - y * y / count) / count, 0))
+            slope = (xy - x * y / count) / (xx - x * x / count)
+        last = self.values[end - 1, self.score_positions] if end else np.full(len(count), np.nan)
+        return {name: {'count': int(count[i]),
+                       'mean': float(mean[i]),
+                       'std': float(std[i]),
+                       'slope': float(slope[i]),
+                       'last': float(last[i])}
+                for i, name in enumerate(self.score_columns) if count[i]}
+
+    def to_csv(self, path):
+        values = self.values[:self.size]
+        with open(path, 'w', newline='', encoding='utf-8') as timeline:
+            writer = csv.writer(timeline)
+            writer.writerow(['date'] + self.columns)
+            for date, row in zip(self.dates, values):
+                writer.writerow([str(date)] + ['' if np.isnan(v) else repr(float(v)) for v in row])
+
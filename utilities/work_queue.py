@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Durable SQLite task queue with leases, shared by crawl worker processes
+#
+# A leased task belongs to its worker until the lease expires. Workers
+# extend it with heartbeat(); tasks whose worker died are leased again once
+# the lease runs out. A task may wait for every task whose parent is its
+# wait_for key to finish before it can be leased.
+#
+# The database may sit on NFS and be shared by workers on several boxes.
+# WAL needs shared memory on one host, and fcntl locks are unreliable over
+# NFS. So the queue uses a rollback journal and SQLite's dotfile locking,
+# and every connection is opened and closed under FileLock, a link() based
+# lock file. Holding the lock from open to close also gives NFS
+# close-to-open consistency, so no worker reads pages cached before
+# another's commit.
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import quote
+
+from utilities import json_codec
+
+logger = logging.getLogger(__name__)
+
+Task = namedtuple('Task', ['id', 'kind', 'key', 'payload', 'attempts'])
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL UNIQUE,
+    payload TEXT NOT NULL,
+    priority REAL NOT NULL DEFAULT 0,
+    parent TEXT,
+    wait_for TEXT,
+    state TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, priority);
+CREATE INDEX IF NOT EXISTS tasks_parent ON tasks (parent, state);
+'''
+
+
+class TaskFailed(Exception):
+    # raised by a task that retrying cannot fix
+    pass
+
+
+def remove_stale_dotfile(path):
+    # only the FileLock holder ever takes SQLite's dotfile lock, so one that
+    # is there before we connect was left by a worker killed mid-transaction;
+    # the hot journal next to it is rolled back on the next read
+    try:
+        os.rmdir(path)
+    except NotADirectoryError:
+        os.unlink(path)
+    except FileNotFoundError:
+        return
+    logger.error('removed stale sqlite lock %s', path)
+
+
+def get_identity(stat):
+    # inode numbers are reused, the mtime tells a new lock file from an old one
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def get_worker_id():
+    return '{}:{}:{}'.format(socket.gethostname(), os.getpid(), threading.get_ident())
+
+
+class FileLock:
+    # link() is atomic on NFS where O_EXCL and fcntl are not; the unique
+    # file's link count says whether the link went through even when the
+    # server's reply was lost. Not {path}.lock, which the dotfile VFS uses.
+
+    STALE_SECONDS = 30
+    POLL_SECONDS = 0.005
+
+    def __init__(self, path):
+        self.path = path
+
+    def acquire(self):
+        # returns the token release() needs
+        unique = self.get_unique_path('')
+        with open(unique, 'w', encoding='utf-8') as owner:
+            owner.write(get_worker_id())
+        # measured against the file server's clock, not this box's
+        started, waited = os.stat(unique).st_mtime, time.monotonic()
+        try:
+            while True:
+                try:
+                    os.link(unique, self.path)
+                except OSError:
+                    pass
+                linked = os.stat(unique)
+                if linked.st_nlink == 2:
+                    return get_identity(linked)
+                self.break_stale(started + time.monotonic() - waited)
+                time.sleep(self.POLL_SECONDS)
+        finally:
+            os.unlink(unique)
+
+    def break_stale(self, now):
+        # a lock is held for one short transaction, so an old one belongs
+        # to a worker that died holding it. Waiters all see it go stale at
+        # once, so it is renamed aside and only deleted if it is still the
+        # lock judged stale, not one another waiter has since taken.
+        try:
+            lock = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if now - lock.st_mtime <= self.STALE_SECONDS:
+            return
+        stale = self.get_unique_path('.stale')
+        try:
+            os.rename(self.path, stale)
+        except FileNotFoundError:
+            return
+        if get_identity(os.stat(stale)) == get_identity(lock):
+            logger.error('breaking stale queue lock %s', self.path)
+        else:
+            try:
+                # put the live lock back unless a waiter already took the path
+                os.link(stale, self.path)
+            except FileExistsError:
+                logger.error('queue lock %s was taken while breaking a stale one', self.path)
+        os.unlink(stale)
+
+    def release(self, token):
+        try:
+            if get_identity(os.stat(self.path)) == token:
+                os.unlink(self.path)
+                return
+        except FileNotFoundError:
+            pass
+        logger.error('queue lock %s was broken while held', self.path)
+
+    def get_unique_path(self, suffix):
+        return '{}{}.{}'.format(self.path, suffix, get_worker_id().replace(':', '.'))
+
+
+class WorkQueue:
+
+    def __init__(self, path, lease_seconds=60, max_attempts=3):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.lock = FileLock('{}.mutex'.format(path))
+        with self.connect() as connection:
+            connection.execute('PRAGMA journal_mode=DELETE')
+            connection.executescript(SCHEMA)
+
+    def connect(self):
+        token = self.lock.acquire()
+        try:
+            remove_stale_dotfile('{}.lock'.format(self.path))
+            connection = sqlite3.connect('file:{}?vfs=unix-dotfile'.format(quote(os.path.abspath(self.path))),
+                                         timeout=60, isolation_level=None, uri=True)
+        except Exception:
+            self.lock.release(token)
+            raise
+        return Connection(connection, self.lock, token)
+
+    def put(self, kind, key, payload, priority=0, parent=None, wait_for=None):
+        with self.connect() as connection:
+            cursor = connection.execute(
+                'INSERT OR IGNORE INTO tasks (kind, key, payload, priority, parent, wait_for, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (kind, key, json_codec.dumps(payload, pretty=False), priority, parent, wait_for, time.time()))
+            return cursor.rowcount == 1
+
+    def lease(self, owner):
+        now = time.time()
+        with self.connect() as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                # expired leases that used up their attempts are given up on
+                connection.execute(
+                    "UPDATE tasks SET state = 'failed', owner = NULL, error = 'lease expired', updated = ? "
+                    "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+                    (now, now, self.max_attempts))
+                row = connection.execute(
+                    "SELECT id, kind, key, payload, attempts FROM tasks "
+                    "WHERE (state = 'pending' OR (state = 'leased' AND lease_expires < ?)) "
+                    "AND (wait_for IS NULL OR NOT EXISTS ("
+                    "    SELECT 1 FROM tasks AS child "
+                    "    WHERE child.parent = tasks.wait_for AND child.state IN ('pending', 'leased'))) "
+                    "ORDER BY priority DESC, id LIMIT 1",
+                    (now,)).fetchone()
+                if row is None:
+                    connection.execute('COMMIT')
+                    return None
+                connection.execute(
+                    "UPDATE tasks SET state = 'leased', owner = ?, lease_expires = ?, "
+                    "attempts = attempts + 1, updated = ? WHERE id = ?",
+                    (owner, now + self.lease_seconds, now, row[0]))
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+        return Task(row[0], row[1], row[2], json_codec.loads(row[3]), row[4] + 1)
+
+    def heartbeat(self, task, owner):
+        with self.connect() as connection:
+            cursor = connection.execute(
+                "UPDATE tasks SET lease_expires = ?, updated = ? "
+                "WHERE id = ? AND owner = ? AND state = 'leased'",
+                (time.time() + self.lease_seconds, time.time(), task.id, owner))
+            return cursor.rowcount == 1
+
+    def complete(self, task, owner):
+        with self.connect() as connection:
+            cursor = connection.execute(
+                "UPDATE tasks SET state = 'done', lease_expires = NULL, updated = ? "
+                "WHERE id = ? AND owner = ? AND state = 'leased'",
+                (time.time(), task.id, owner))
+            return cursor.rowcount == 1
+
+    def fail(self, task, owner, error, retry=True):
+        with self.connect() as connection:
+            cursor = connection.execute(
+                "UPDATE tasks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "owner = NULL, lease_expires = NULL, error = ?, updated = ? "
+                "WHERE id = ? AND owner = ? AND state = 'leased'",
+                (self.max_attempts if retry else 0, str(error), time.time(), task.id, owner))
+            return cursor.rowcount == 1
+
+    def counts(self):
+        with self.connect() as connection:
+            rows = connection.execute('SELECT kind, state, COUNT(*) FROM tasks GROUP BY kind, state').fetchall()
+        counts = dict()
+        for kind, state, count in rows:
+            counts.setdefault(kind, dict())[state] = count
+        return counts
+
+    def child_counts(self, parent):
+        with self.connect() as connection:
+            rows = connection.execute('SELECT state, COUNT(*) FROM tasks WHERE parent = ? GROUP BY state',
+                                      (parent,)).fetchall()
+        return dict(rows)
+
+    def is_finished(self):
+        with self.connect() as connection:
+            row = connection.execute(
+                "SELECT COUNT(*) FROM tasks WHERE state IN ('pending', 'leased')").fetchone()
+        return row[0] == 0
+
+
+class Connection:
+    # sqlite3's own context manager commits but never closes
+
+    def __init__(self, connection, lock, token):
+        self.connection = connection
+        self.lock = lock
+        self.token = token
+
+    def __enter__(self):
+        return self.connection
+
+    def __exit__(self, *exc):
+        try:
+            self.connection.close()
+        finally:
+            self.lock.release(self.token)
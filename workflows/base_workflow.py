@@ -3,15 +3,20 @@
 from abc import abstractmethod
 from abc import ABCMeta
 import configparser
+import os
+
+ROOT_PATH = os.environ.get('KISS_AND_MAKEUP_ROOT',
+                           '/Users/mars_williams/kiss_and_makeup')
 
 
 class BaseWorkflow:
     __metaclass__ = ABCMeta
 
     def __init__(self):
-        self.data_path = '/Users/mars_williams/kiss_and_makeup/data'
+        self.root_path = ROOT_PATH
+        self.data_path = os.path.join(self.root_path, 'data')
         self.config = configparser.ConfigParser()
-        self.config.read('/Users/mars_williams/kiss_and_makeup/config/makeup.conf')
+        self.config.read(os.path.join(self.root_path, 'config', 'makeup.conf'))
 
     @abstractmethod
     def process(self):
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Read-only sku snapshot file for random access through mmap
+#
+# Layout: a 32 byte header, the records as compact JSON back to back, then
+# an index of fixed width (sku_number, offset, length) entries sorted by
+# sku_number. A lookup is a binary search over the index plus one slice, and
+# every process that opens the file shares the same page cache.
+import mmap
+import os
+import struct
+
+from utilities import json_codec
+from workflows.sku_record import loads_skus
+
+MAGIC = b'KMSNAP01'
+HEADER = struct.Struct('<8sQQI4x')
+OFFSETS = struct.Struct('<QI')
+
+
+def write_snapshot(path, skus):
+    entries = dict()
+    temporary = '{}.tmp'.format(path)
+    with open(temporary, 'wb') as snapshot:
+        snapshot.write(b'\0' * HEADER.size)
+        for sku_number, sku in skus:
+            encoded = json_codec.dumpb(sku, pretty=False)
+            entries[str(sku_number).encode('utf-8')] = (snapshot.tell(), len(encoded))
+            snapshot.write(encoded)
+        index_offset = snapshot.tell()
+        key_width = max([len(key) for key in entries] or [1])
+        for key in sorted(entries):
+            snapshot.write(key.ljust(key_width, b'\0'))
+            snapshot.write(OFFSETS.pack(*entries[key]))
+        snapshot.seek(0)
+        snapshot.write(HEADER.pack(MAGIC, len(entries), index_offset, key_width))
+    os.replace(temporary, path)
+    return len(entries)
+
+
+def iter_sku_files(paths):
+    for path in paths:
+        with open(path, encoding='utf-8') as skus:
+            for sku_number, sku in json_codec.load(skus).items():
+                if isinstance(sku, dict):
+                    yield sku_number, sku
+
+
+class CatalogSnapshot:
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.index_offset, self.key_width = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError('{} is not a catalog snapshot'.format(path))
+        self.entry_size = self.key_width + OFFSETS.size
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, sku_number):
+        return self.find(sku_number) is not None
+
+    def get_key(self, position):
+        start = self.index_offset + position * self.entry_size
+        return self.map[start:start + self.key_width]
+
+    def find(self, sku_number):
+        key = str(sku_number).encode('utf-8')
+        if len(key) > self.key_width:
+            return None
+        key = key.ljust(self.key_width, b'\0')
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.get_key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self.get_key(low) == key:
+            return OFFSETS.unpack_from(self.map, self.index_offset + low * self.entry_size + self.key_width)
+        return None
+
+    def get_bytes(self, sku_number):
+        found = self.find(sku_number)
+        if found is None:
+            return None
+        offset, length = found
+        return self.map[offset:offset + length]
+
+    def get(self, sku_number, keep_raw=False):
+        encoded = self.get_bytes(sku_number)
+        return loads_skus(encoded, keep_raw) if encoded is not None else None
+
+    def keys(self):
+        for position in range(self.count):
+            yield self.get_key(position).rstrip(b'\0').decode('utf-8')
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
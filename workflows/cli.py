@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Command line entry point for the scraping and loading workflows
+#
+#     python -m workflows.cli crawl
+#     python -m workflows.cli shard seed|work|status
+#     python -m workflows.cli refresh [--once | --status]
+#     python -m workflows.cli replay-errors
+#     python -m workflows.cli load [--snapshot PATH --sku N ...]
+#     python -m workflows.cli snapshot
+#     python -m workflows.cli score-timeline
+#     python -m workflows.cli normalize-mappings
+#
+# Workflow modules (and requests, bs4, selenium, numpy) are only imported by the
+# subcommand that needs them. --profile DIR turns on the per-stage profiling
+# hooks in utilities/profiling.py.
+import argparse
+import logging
+import os
+import sys
+
+
+def crawl(args):
+    from workflows.crawl_scheduler import CrawlScheduler
+
+    scheduler = CrawlScheduler(workers=args.workers)
+    scheduler.get_scraper().sku_scraper.keep_raw = args.keep_raw
+    categories = scheduler.get_scraper().categories
+    if args.categories:
+        categories = {k: v for k, v in categories.items() if k in args.categories}
+    scheduler.crawl(categories)
+
+
+def shard(args):
+    from workflows.sharded_crawl import ShardedCrawl
+
+    crawl = ShardedCrawl(queue_path=args.queue, lease_seconds=args.lease_seconds)
+    if args.action == 'seed':
+        categories = crawl.get_scraper().categories
+        if args.categories:
+            categories = {k: v for k, v in categories.items() if k in args.categories}
+        crawl.seed(categories)
+    elif args.action == 'work':
+        if args.workers > 1:
+            crawl.run_local(args.workers)
+        else:
+            crawl.run_worker()
+    for kind, states in sorted(crawl.queue.counts().items()):
+        print(kind, ', '.join('{} {}'.format(state, count) for state, count in sorted(states.items())))
+
+
+def refresh(args):
+    import time
+
+    from workflows.refresh_scheduler import RefreshScheduler
+
+    scheduler = RefreshScheduler(requests_per_hour=args.requests_per_hour, state_path=args.state)
+    categories = scheduler.get_categories()
+    if args.categories:
+        categories = {k: v for k, v in categories.items() if k in args.categories}
+    if args.status:
+        print('{:<32} {:>6} {:>7} {:>11} {:>10} {:>8} {:>8}'.format(
+            'category', 'crawls', 'changes', 'changes/day', 'interval h', 'due in h', 'requests'))
+        for row in scheduler.report(time.time(), categories):
+            print('{:<32} {:>6} {:>7} {:>11} {:>10.1f} {:>8.1f} {:>8}'.format(
+                row['category'], row['crawls'], row['changes'],
+                '{:.2f}'.format(row['changes_per_day']),
+                row['interval_hours'], row['due_in_hours'], row['requests']))
+        return
+    crawled = scheduler.run(categories, once=args.once)
+    print('refreshed', len(crawled), 'categories')
+
+
+def replay_errors(args):
+    from workflows.sephora_scraper_static_slow import SkuScraper
+
+    scraper = SkuScraper()
+    if args.error_path:
+        scraper.error_path = args.error_path
+    scraper.process()
+
+
+def load(args):
+    from workflows.sephora_loader import SephoraLoader
+
+    loader = SephoraLoader()
+    loader.keep_raw = args.keep_raw
+    if args.sku_path:
+        loader.sku_path = args.sku_path
+    if args.skus:
+        loader.load_skus(args.snapshot or get_snapshot_path(), args.skus)
+    else:
+        loader.process()
+
+
+def get_snapshot_path():
+    from workflows.base_workflow import ROOT_PATH
+
+    return os.path.join(ROOT_PATH, 'data', 'catalog.snapshot')
+
+
+def snapshot(args):
+    from workflows.base_workflow import ROOT_PATH
+    from workflows.catalog_snapshot import iter_sku_files, write_snapshot
+
+    paths = list()
+    for directory in args.paths or [os.path.join(ROOT_PATH, 'data', name)
+                                    for name in ('skus', 'skus_missed', 'skus_new')]:
+        if os.path.isdir(directory):
+            paths.extend(os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                         if name.endswith('.json'))
+    output = args.output or get_snapshot_path()
+    print('wrote', write_snapshot(output, iter_sku_files(paths)), 'skus from', len(paths), 'files to', output)
+
+
+def score_timeline(args):
+    from utilities.timeline import TimelineScorer
+    from workflows.base_workflow import ROOT_PATH
+
+    scorer = TimelineScorer.from_csv(args.path or os.path.join(ROOT_PATH, 'timeline.csv'))
+    means, _ = scorer.rolling(args.window)
+    print('{:<20} {:>6} {:>10} {:>10} {:>10} {:>10} {:>12}'.format(
+        'score', 'days', 'last', 'mean', 'std', 'slope/day', 'rolling mean'))
+    for name, trend in scorer.trends(args.trend_window).items():
+        print('{:<20} {:>6} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.3f} {:>12.2f}'.format(
+            name, trend['count'], trend['last'], trend['mean'], trend['std'], trend['slope'],
+            means[name][-1]))
+    if args.output:
+        scorer.to_csv(args.output)
+
+
+def normalize_mappings(args):
+    from workflows.base_workflow import ROOT_PATH
+    from workflows.sku_mapping import normalize_mapping_files
+
+    paths = args.paths or [os.path.join(ROOT_PATH, 'data', 'errors'),
+                           os.path.join(ROOT_PATH, 'data', 'mappings')]
+    for path in paths:
+        normalize_mapping_files(path)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog='workflows.cli',
+                                     description='Scrape Sephora and load products into the makeup API')
+    parser.add_argument('-v', '--verbose', action='store_true', help='log at debug level')
+    parser.add_argument('--profile', metavar='DIR',
+                        help='write per-stage cpu profiles and allocation snapshots to DIR')
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    subparsers.required = True
+
+    crawl_parser = subparsers.add_parser('crawl', help='crawl products and skus for the revised categories')
+    crawl_parser.add_argument('--category', action='append', dest='categories',
+                              help='only crawl this revised category, e.g. lipstick.json (repeatable)')
+    crawl_parser.add_argument('--workers', type=int, default=1,
+                              help='categories crawled at once, largest first by past cost')
+    crawl_parser.add_argument('--keep-raw', action='store_true',
+                              help='save every getSkuJson.jsp field, not just the ones the loader reads')
+    crawl_parser.set_defaults(func=crawl)
+
+    shard_parser = subparsers.add_parser('shard', help='crawl with worker processes sharing a sqlite queue')
+    shard_parser.add_argument('action', choices=('seed', 'work', 'status'))
+    shard_parser.add_argument('--queue', help='queue database, defaults to data/crawl_queue.sqlite')
+    shard_parser.add_argument('--workers', type=int, default=1, help='worker processes to start on this box')
+    shard_parser.add_argument('--lease-seconds', type=float, default=60,
+                              help='how long a silent worker keeps its task')
+    shard_parser.add_argument('--category', action='append', dest='categories',
+                              help='only seed this revised category (repeatable)')
+    shard_parser.set_defaults(func=shard)
+
+    refresh_parser = subparsers.add_parser('refresh',
+                                           help='keep re-crawling categories as often as they change')
+    refresh_parser.add_argument('--once', action='store_true', help='crawl what is due now and exit')
+    refresh_parser.add_argument('--status', action='store_true',
+                                help='print each category\'s change rate and next refresh')
+    refresh_parser.add_argument('--requests-per-hour', type=int,
+                                help='request budget, estimated from data/crawl_costs.json')
+    refresh_parser.add_argument('--state', help='scheduler state, defaults to data/refresh_state.json')
+    refresh_parser.add_argument('--category', action='append', dest='categories',
+                                help='only refresh this revised category (repeatable)')
+    refresh_parser.set_defaults(func=refresh)
+
+    replay_parser = subparsers.add_parser('replay-errors', help='re-fetch skus recorded in data/errors')
+    replay_parser.add_argument('--error-path', help='directory of error records to replay')
+    replay_parser.set_defaults(func=replay_errors)
+
+    load_parser = subparsers.add_parser('load', help='post transformed skus to the makeup API')
+    load_parser.add_argument('--sku-path', help='directory of sku json files to load')
+    load_parser.add_argument('--keep-raw', action='store_true',
+                             help='keep every sku field in memory while loading')
+    load_parser.add_argument('--sku', action='append', dest='skus',
+                             help='only load this sku number from the catalog snapshot (repeatable)')
+    load_parser.add_argument('--snapshot', help='catalog snapshot for --sku, defaults to data/catalog.snapshot')
+    load_parser.set_defaults(func=load)
+
+    snapshot_parser = subparsers.add_parser('snapshot',
+                                            help='build the mmap catalog snapshot from the sku dumps')
+    snapshot_parser.add_argument('paths', nargs='*',
+                                 help='directories of sku json files, later ones win, '
+                                      'defaults to data/skus, data/skus_missed and data/skus_new')
+    snapshot_parser.add_argument('--output', help='snapshot file, defaults to data/catalog.snapshot')
+    snapshot_parser.set_defaults(func=snapshot)
+
+    timeline_parser = subparsers.add_parser('score-timeline',
+                                            help='recompute timeline.csv scores and report trends')
+    timeline_parser.add_argument('--path', help='timeline csv, defaults to timeline.csv in the repo root')
+    timeline_parser.add_argument('--window', type=int, default=7, help='rolling window in days')
+    timeline_parser.add_argument('--trend-window', type=int,
+                                 help='only fit trends over the last N days')
+    timeline_parser.add_argument('--output', help='write the rescored timeline to this csv')
+    timeline_parser.set_defaults(func=score_timeline)
+
+    mappings_parser = subparsers.add_parser('normalize-mappings',
+                                            help='rewrite saved error and mapping files in the normalized format')
+    mappings_parser.add_argument('paths', nargs='*',
+                                 help='directories to rewrite, defaults to data/errors and data/mappings')
+    mappings_parser.set_defaults(func=normalize_mappings)
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+    if args.profile:
+        # read when the workflow modules are imported by the subcommand
+        os.environ['KISS_AND_MAKEUP_PROFILE'] = os.path.abspath(args.profile)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
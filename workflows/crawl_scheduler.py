@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Orders category crawls by their cost in previous runs
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utilities import json_codec
+from workflows.base_workflow import BaseWorkflow
+
+logger = logging.getLogger(__name__)
+
+
+class CrawlScheduler(BaseWorkflow):
+
+    # runs kept per category; estimates are their median so one slow or
+    # failed-fast run doesn't reorder the plan
+    HISTORY_SIZE = 5
+    COST_FIELDS = ('seconds', 'pages', 'products', 'skus')
+
+    def __init__(self, scraper=None, workers=1):
+        super(CrawlScheduler, self).__init__()
+        self.cost_path = os.path.join(self.data_path, 'crawl_costs.json')
+        self.workers = workers
+        self.scraper = scraper
+        self.costs = self.get_costs()
+        self.lock = threading.Lock()
+
+    def process(self):
+        self.crawl(self.get_scraper().categories)
+
+    def get_scraper(self):
+        if self.scraper is None:
+            from workflows.sephora_scraper_static import ProductScraper
+
+            self.scraper = ProductScraper()
+        return self.scraper
+
+    def get_costs(self):
+        if not os.path.exists(self.cost_path):
+            return dict()
+        with open(self.cost_path, encoding='utf-8') as costs:
+            return json_codec.load(costs)
+
+    def save_costs(self):
+        with open(self.cost_path, 'w', encoding='utf-8') as costs:
+            json_codec.dump(self.costs, costs, pretty=False)
+
+    def get_removed_categories(self):
+        path = os.path.join(self.root_path, 'removed.json')
+        if not os.path.exists(path):
+            return set()
+        with open(path, encoding='utf-8') as removed:
+            # removed.json is edited by hand and may keep a trailing comma
+            return set(json_codec.loads(re.sub(r',\s*]', ']', removed.read())))
+
+    def estimate(self, category):
+        cost = self.costs.get(category, None)
+        if cost:
+            return cost['seconds']
+        known = [c['seconds'] for c in self.costs.values()]
+        # never-crawled categories go first so they can't become the long tail
+        return max(known) if known else 0
+
+    def plan(self, categories):
+        removed = self.get_removed_categories()
+        planned = [category for category in categories
+                   if categories[category] and category not in removed]
+        return sorted(planned, key=self.estimate, reverse=True)
+
+    def crawl(self, categories):
+        planned = self.plan(categories)
+        scraper = self.get_scraper()
+        print('crawling', len(planned), 'categories with', self.workers, 'workers')
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(scraper.save_category_data, category, categories[category]): category
+                       for category in planned}
+            for future in as_completed(futures):
+                self.record(futures[future], future.result())
+        print('crawled', len(planned), 'categories in', round(time.time() - start, 1), 'seconds')
+
+    def record(self, category, cost):
+        if not cost:
+            logger.error('no cost recorded for %s', category)
+            return
+        with self.lock:
+            previous = self.costs.get(category, dict())
+            # entries written before the history was kept are their only run
+            history = previous.get('history', [previous] if previous else list())
+            run = {field: cost.get(field, 0) for field in self.COST_FIELDS}
+            run['crawled_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+            history = (history + [run])[-self.HISTORY_SIZE:]
+            entry = {field: get_median([past.get(field, 0) or 0 for past in history])
+                     for field in self.COST_FIELDS}
+            entry.update(crawled_at=run['crawled_at'], history=history)
+            self.costs[category] = entry
+            self.save_costs()
+
+
+def get_median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[middle]
+    return (ordered[middle - 1] + ordered[middle]) / 2.0
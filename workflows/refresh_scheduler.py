@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Long running re-crawl that refreshes each category as often as it changes
+#
+# After every crawl the category's product listing and tracked sku fields
+# are fingerprinted. EWMAs of how often a crawl saw a change (p) and of the
+# hours between crawls (t), starting from PRIOR_CHANGES_PER_DAY, give the
+# change rate as a Poisson process: -ln(1 - p) / t, which unlike p / t does
+# not saturate for categories that change on nearly every crawl. Refresh
+# intervals spend the request budget where
+# it buys the most freshness: interval ~ sqrt(requests / change rate),
+# scaled so the planned crawls use TARGET_UTILIZATION of requests_per_hour
+# and clamped to [MIN_INTERVAL, MAX_INTERVAL]. Request costs come from
+# crawl_costs.json. Due categories are crawled most overdue first, and the
+# requests sent in the past hour never exceed the budget.
+import hashlib
+import logging
+import math
+import os
+import time
+
+from utilities import json_codec
+from workflows.base_workflow import BaseWorkflow
+from workflows.crawl_scheduler import CrawlScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshScheduler(BaseWorkflow):
+
+    REQUESTS_PER_HOUR = 200
+    # leave headroom for categories that come due together
+    TARGET_UTILIZATION = 0.8
+    MIN_INTERVAL = 60 * 60
+    MAX_INTERVAL = 7 * 24 * 60 * 60
+    EWMA_ALPHA = 0.3
+    PRIOR_CHANGES_PER_DAY = 1.0
+    # keeps the rate finite when every recent crawl saw a change
+    MAX_CHANGE_FRACTION = 0.95
+    # requests for a category that was never crawled, when no costs are known
+    DEFAULT_REQUESTS = 100
+    POLL_SECONDS = 60
+    TRACKED_FIELDS = ('list_price', 'sku_size', 'variation_value')
+
+    def __init__(self, scheduler=None, requests_per_hour=None, state_path=None):
+        super(RefreshScheduler, self).__init__()
+        self.scheduler = scheduler or CrawlScheduler()
+        self.requests_per_hour = requests_per_hour or self.REQUESTS_PER_HOUR
+        self.state_path = state_path or os.path.join(self.data_path, 'refresh_state.json')
+        self.state = self.get_state()
+
+    def process(self):
+        self.run()
+
+    def get_state(self):
+        if not os.path.exists(self.state_path):
+            return {'categories': dict(), 'spent': list()}
+        with open(self.state_path, encoding='utf-8') as state:
+            return json_codec.load(state)
+
+    def save_state(self):
+        with open(self.state_path, 'w', encoding='utf-8') as state:
+            json_codec.dump(self.state, state, pretty=False)
+
+    def get_categories(self):
+        categories = self.scheduler.get_scraper().categories
+        return {category: categories[category] for category in self.scheduler.plan(categories)}
+
+    def run(self, categories=None, once=False):
+        while True:
+            crawled = self.tick(time.time(), categories)
+            if once:
+                return crawled
+            time.sleep(self.POLL_SECONDS)
+
+    def tick(self, now, categories=None):
+        categories = categories if categories is not None else self.get_categories()
+        crawled = list()
+        selected = self.select(now, categories)
+        for category in selected:
+            fingerprints = self.crawl_category(category, categories[category])
+            self.spend(now, self.estimate_requests(category))
+            self.observe(category, fingerprints, now)
+            if fingerprints is not None:
+                crawled.append(category)
+        if selected:
+            self.save_state()
+        return crawled
+
+    def crawl_category(self, category, revised_category):
+        scraper = self.scheduler.get_scraper()
+        cost = scraper.save_category_data(category, revised_category)
+        self.scheduler.record(category, cost)
+        if not cost:
+            return None
+        try:
+            return self.get_fingerprints(category)
+        except (IOError, ValueError) as error:
+            logger.error('could not fingerprint %s: %s', category, error)
+            return None
+
+    def get_fingerprints(self, category):
+        scraper = self.scheduler.get_scraper()
+        name = category.replace(' ', '_')
+        with open(os.path.join(scraper.product_path, name), encoding='utf-8') as products:
+            products = json_codec.load(products).get('products', list())
+        with open(os.path.join(scraper.sku_scraper.sku_path, name), encoding='utf-8') as skus:
+            skus = json_codec.load(skus)
+        listing = sorted([product['id'], sorted(product.get('sku_ids') or list())] for product in products)
+        fields = sorted([sku_number, [sku.get(field, None) for field in self.TRACKED_FIELDS]]
+                        for sku_number, sku in skus.items() if isinstance(sku, dict))
+        return {'products': get_digest(listing), 'skus': get_digest(fields)}
+
+    def observe(self, category, fingerprints, now):
+        state = self.state['categories'].setdefault(category, {
+            'crawls': 0,
+            'changes': 0,
+            'ewma': [1 - math.exp(-self.PRIOR_CHANGES_PER_DAY), 24.0]})
+        previous = state.get('fingerprints', None)
+        changed = bool(previous and fingerprints and previous != fingerprints)
+        # a failed crawl (no fingerprints) only pushes the next attempt back
+        if previous and fingerprints and state.get('last_crawl', None) is not None:
+            hours = (now - state['last_crawl']) / 3600.0
+            state['ewma'] = [self.EWMA_ALPHA * sample + (1 - self.EWMA_ALPHA) * average
+                             for sample, average in zip((float(changed), hours), state['ewma'])]
+        if fingerprints:
+            state['fingerprints'] = fingerprints
+            state['crawls'] += 1
+        state['last_crawl'] = now
+        state['changes'] += int(changed)
+        if changed:
+            logger.info('%s changed, %.2f changes per day', category, self.get_rate(category) * 24)
+        return changed
+
+    def get_rate(self, category):
+        # changes per hour
+        state = self.state['categories'].get(category, None)
+        if not state:
+            return self.PRIOR_CHANGES_PER_DAY / 24.0
+        fraction, hours = state['ewma']
+        if not hours:
+            return self.PRIOR_CHANGES_PER_DAY / 24.0
+        return -math.log(1 - min(fraction, self.MAX_CHANGE_FRACTION)) / hours
+
+    def get_intervals(self, categories):
+        weights = {category: (self.estimate_requests(category), self.get_rate(category))
+                   for category in categories}
+        budget = self.requests_per_hour * self.TARGET_UTILIZATION
+        scale = sum(math.sqrt(requests * rate) for requests, rate in weights.values()) / budget
+        intervals = dict()
+        for category, (requests, rate) in weights.items():
+            hours = math.sqrt(requests / rate) * scale if rate > 0 else float('inf')
+            intervals[category] = min(max(hours * 3600, self.MIN_INTERVAL), self.MAX_INTERVAL)
+        return intervals
+
+    def get_due_at(self, category, intervals):
+        state = self.state['categories'].get(category, None)
+        if not state or state.get('last_crawl', None) is None:
+            return 0
+        return state['last_crawl'] + intervals[category]
+
+    def get_priority(self, category, now, intervals):
+        state = self.state['categories'].get(category, None)
+        if not state or state.get('last_crawl', None) is None:
+            return float('inf')
+        return (now - state['last_crawl']) / intervals[category]
+
+    def estimate_requests(self, category):
+        costs = self.scheduler.costs
+        if category in costs:
+            return get_requests(costs[category])
+        known = [get_requests(cost) for cost in costs.values()]
+        return max(known) if known else self.DEFAULT_REQUESTS
+
+    def get_spent(self, now):
+        self.state['spent'] = [[at, requests] for at, requests in self.state['spent'] if at > now - 3600]
+        return sum(requests for _, requests in self.state['spent'])
+
+    def spend(self, now, requests):
+        self.state['spent'].append([now, requests])
+
+    def select(self, now, categories):
+        intervals = self.get_intervals(categories)
+        due = [category for category in categories if self.get_due_at(category, intervals) <= now]
+        due.sort(key=lambda category: self.get_priority(category, now, intervals), reverse=True)
+        available = self.requests_per_hour - self.get_spent(now)
+        selected = list()
+        for category in due:
+            requests = self.estimate_requests(category)
+            # a category larger than the whole budget still runs once the hour is clear
+            if requests > available and (selected or available < self.requests_per_hour):
+                # strict priority order, so expensive categories can't be starved
+                break
+            selected.append(category)
+            available -= requests
+        return selected
+
+    def report(self, now, categories):
+        intervals = self.get_intervals(categories)
+        rows = list()
+        for category in sorted(categories, key=lambda category: self.get_due_at(category, intervals)):
+            state = self.state['categories'].get(category, dict())
+            rows.append({'category': category,
+                         'crawls': state.get('crawls', 0),
+                         'changes': state.get('changes', 0),
+                         'changes_per_day': self.get_rate(category) * 24,
+                         'interval_hours': intervals[category] / 3600.0,
+                         'due_in_hours': max(self.get_due_at(category, intervals) - now, 0) / 3600.0,
+                         'requests': self.estimate_requests(category)})
+        return rows
+
+
+def get_requests(cost):
+    # a listing page per PAGE_SIZE products, one product call each, one sku call
+    return cost.get('pages', 0) + cost.get('products', 0) + 1
+
+
+def get_digest(value):
+    return hashlib.sha1(json_codec.dumpb(value, pretty=False)).hexdigest()
@@ -1,13 +1,15 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 # Retrieves product data from Sephora Rest API
-import json
 import logging
 import os
+import threading
 
-from requests import Request, Session
+from requests import Session
 
-from base_workflow import BaseWorkflow
+from workflows.base_workflow import BaseWorkflow
+from workflows.sku_record import SkuRecord, loads_skus
+from utilities.profiling import profiled
 from utilities.strings import remove_escape_characters, remove_html_tags
 
 logger = logging.getLogger(__name__)
@@ -22,6 +24,8 @@ class SephoraLoader(BaseWorkflow):
         super(SephoraLoader, self).__init__()
         self.sku_path = os.path.join(self.data_path, 'skus_missed')
         self.categories = dict()
+        self.keep_raw = False
+        self.local = threading.local()
 
     def process(self):
         json_files = [
@@ -35,12 +39,27 @@ class SephoraLoader(BaseWorkflow):
                 if transformed:
                     self.post_product_data(transformed)
 
+    def load_skus(self, snapshot_path, sku_numbers):
+        from workflows.catalog_snapshot import CatalogSnapshot
+
+        with CatalogSnapshot(snapshot_path) as snapshot:
+            for sku_number in sku_numbers:
+                data = snapshot.get(sku_number, self.keep_raw)
+                if data is None:
+                    print('sku', sku_number, 'is not in', snapshot_path)
+                    continue
+                transformed = self.transform_product_data(data)
+                if transformed:
+                    self.post_product_data(transformed)
+
+    @profiled('parse')
     def read_products_data(self, json_file):
-        with open(json_file) as j:
-            return json.loads(j.read())
+        with open(json_file, encoding='utf-8') as j:
+            return loads_skus(j.read(), self.keep_raw)
 
+    @profiled('transform')
     def transform_product_data(self, data):
-        if isinstance(data, dict):
+        if isinstance(data, (dict, SkuRecord)):
             try:
                 transformed_data = {
                     'brand': data.get('primary_product', dict()).get('brand_name', None),
@@ -162,21 +181,27 @@ class SephoraLoader(BaseWorkflow):
         else:
             return None
 
+    def get_session(self):
+        # one keep-alive session per thread, requests sessions aren't thread safe
+        if not hasattr(self.local, 'session'):
+            self.local.session = Session()
+            self.local.session.auth = (self.config['heroku']['username'],
+                                       self.config['heroku']['password'])
+        return self.local.session
+
+    @profiled('upload')
     def post_product_data(self, product):
         products_endpoint = '{API_URL}/products/'.format(API_URL=self.API_URL)
         try:
-            request = Request(method='POST',
-                              url=products_endpoint,
-                              json=product,
-                              auth=(self.config['heroku']['username'],
-                                    self.config['heroku']['password']))
-            session = Session()
-            response = session.send(request.prepare())
-            print(response.status_code)
-            if response.status_code != 201:
-                if response.status_code != 409:
-                    print(response.request.body, response.status_code)
-        except Exception:
-            pass
-
-SephoraLoader().process()
+            response = self.get_session().post(products_endpoint, json=product)
+            logger.debug('%s %s', product['skus'], response.status_code)
+            if response.status_code not in (201, 409):
+                logger.warning('upload of %s returned %s', product['skus'], response.status_code)
+            return response.status_code
+        except Exception as error:
+            logger.error('upload to %s failed: %s', products_endpoint, error)
+            return None
+
+
+if __name__ == '__main__':
+    SephoraLoader().process()
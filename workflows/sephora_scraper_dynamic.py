@@ -8,9 +8,8 @@ import os
 from urllib.parse import urlparse
 
 import requests
-from selenium import webdriver
-from selenium.webdriver.common.by import By
 
+from utilities import json_codec
 from workflows.base_workflow import BaseWorkflow
 
 logger = logging.getLogger(__name__)
@@ -34,6 +33,8 @@ class ProductScraper(BaseWorkflow):
         self.sku_scraper = SkuScraper(categories=self.categories)
 
     def set_driver(self, root_url):
+        from selenium import webdriver
+
         if not self.use_firefox:
             driver = webdriver.PhantomJS(executable_path=self.phantomjs_path)
         else:
@@ -47,11 +48,13 @@ class ProductScraper(BaseWorkflow):
         self.quit()
 
     def get_revised_categories(self):
-        with open('/Users/mars_williams/kiss_and_makeup/revised_categories.json') as categories:
-            cat = json.loads(categories.read())
+        with open(os.path.join(self.root_path, 'revised_categories.json'), encoding='utf-8') as categories:
+            cat = json_codec.load(categories)
             return {k: cat[k] for k in cat if cat[k]}
 
     def get_dynamic_categories(self):
+        from selenium.webdriver.common.by import By
+
         categories = list()
         main_category_items = self.driver.find_element(
             By.CSS_SELECTOR,
@@ -157,7 +160,7 @@ class ProductScraper(BaseWorkflow):
             data = requests.get('{product_endpoint}&currentPage=1'.format(
                 product_endpoint=products_endpoint))
             if data.content:
-                data = data.json()
+                data = json_codec.loads_response(data)
                 total_products = data.get('total_products', 0)
                 total_pages = math.ceil(total_products/self.PAGE_SIZE)
                 for page in range(2, total_pages+1):
@@ -165,7 +168,7 @@ class ProductScraper(BaseWorkflow):
                         '{product_endpoint}&currentPage={page}'.format(
                             product_endpoint=products_endpoint,
                             page=page))
-                    data['products'].extend(r.json().get('products', list()))
+                    data['products'].extend(json_codec.loads_response(r).get('products', list()))
                 return data
         except Exception as error:
             logger.error(error, products_endpoint)
@@ -174,9 +177,9 @@ class ProductScraper(BaseWorkflow):
     def save_product_data(self, product_data, name):
         print('saving', name)
         with open(os.path.join(self.product_path,
-                               '{name}.json'.format(name=name)), 'w') as outfile:
+                               '{name}.json'.format(name=name)), 'w', encoding='utf-8') as outfile:
             try:
-                json.dump(product_data, outfile, sort_keys=True, indent=4)
+                json_codec.dump(product_data, outfile)
             except json.decoder.JSONDecodeError:
                 pass
 
@@ -198,7 +201,7 @@ class ProductScraper(BaseWorkflow):
         try:
             data = requests.get(product_endpoint)
             if data.content:
-                json_format = data.json()
+                json_format = json_codec.loads_response(data)
                 return json_format.get('sku_ids', str()).split(','),\
                        json_format.get('quick_look_desc', None)
         except Exception as error:
@@ -206,7 +209,8 @@ class ProductScraper(BaseWorkflow):
             return {'product_endpoint': product_endpoint}
 
     def quit(self):
-        self.driver.quit()
+        if self.driver:
+            self.driver.quit()
 
 
 class SkuScraper(BaseWorkflow):
@@ -227,8 +231,8 @@ class SkuScraper(BaseWorkflow):
             os.path.join(self.product_path, category): self.categories[category]
             for category in self.categories}
         for category in json_files:
-            with open(category) as j:
-                products = json.loads(j.read())
+            with open(category, encoding='utf-8') as j:
+                products = json_codec.load(j)
                 product_skus_data = self.get_product_skus_data(
                     products['products'])
                 self.save_product_skus_data(
@@ -270,7 +274,7 @@ class SkuScraper(BaseWorkflow):
         try:
             data = requests.get(skus_endpoint)
             if data.content:
-                data = data.json()
+                data = json_codec.loads_response(data)
                 if isinstance(data, list):
                     for sku in data:
                         sku_number = sku['sku_number']
@@ -299,11 +303,13 @@ class SkuScraper(BaseWorkflow):
             return None
 
     def save_product_skus_data(self, data, name):
-        with open(name, 'w') as outfile:
+        with open(name, 'w', encoding='utf-8') as outfile:
             try:
-                json.dump(data, outfile, sort_keys=True, indent=4)
+                json_codec.dump(data, outfile)
             except json.decoder.JSONDecodeError:
                 logger.error(name)
 
-ProductScraper().process()
-# SkuScraper().process()
+
+if __name__ == '__main__':
+    ProductScraper().process()
+    # SkuScraper().process()
@@ -5,13 +5,16 @@ import json
 import logging
 import math
 import os
-from urllib.parse import urlparse
+import time
 
 import requests
-from selenium import webdriver
-from selenium.webdriver.common.by import By
 
+from utilities import json_codec
+from utilities.json_stream import JsonObjectWriter, iter_json_items
+from utilities.profiling import profiled, profiled_iter
 from workflows.base_workflow import BaseWorkflow
+from workflows.sku_mapping import build_mapping, get_product
+from workflows.sku_record import SkuRecord, to_json
 
 logger = logging.getLogger(__name__)
 
@@ -31,28 +34,36 @@ class ProductScraper(BaseWorkflow):
 
     def process(self):
         self.save_products_data(self.categories)
-        self.quit()
 
     def get_revised_categories(self):
-        with open('/Users/mars_williams/kiss_and_makeup/revised_categories.json') as categories:
-            cat = json.loads(categories.read())
+        with open(os.path.join(self.root_path, 'revised_categories.json'), encoding='utf-8') as categories:
+            cat = json_codec.load(categories)
             return {k: cat[k] for k in cat if cat[k]}
 
     def save_products_data(self, categories):
         for category in categories:
-            try:
-                seo_path = category.replace('.json', '')
-                data = self.get_product_data(seo_path)
-                data.update(self.add_products_sku_ids_and_category(
-                    data.get('products', list()), categories[category]))
-                self.save_product_data(data,
-                                       category.replace(' ', '_'))
-                self.sku_scraper.save_sku_data(products=data,
-                                               category=category.replace(' ', '_'))
-
-            except Exception as error:
-                logger.error(error)
+            self.save_category_data(category, categories[category])
 
+    def save_category_data(self, category, revised_category):
+        start = time.time()
+        try:
+            seo_path = category.replace('.json', '')
+            data = self.get_product_data(seo_path)
+            data.update(self.add_products_sku_ids_and_category(
+                data.get('products', list()), revised_category))
+            self.save_product_data(data,
+                                   category.replace(' ', '_'))
+            skus = self.sku_scraper.save_sku_data(products=data,
+                                                  category=category.replace(' ', '_'))
+        except Exception as error:
+            logger.error(error)
+            return None
+        return {'pages': math.ceil(len(data['products']) / self.PAGE_SIZE),
+                'products': len(data['products']),
+                'skus': skus,
+                'seconds': time.time() - start}
+
+    @profiled('fetch')
     def get_product_data(self, category):
         products_endpoint = '{API_URL}/products/' \
                             '?categoryName={category_name}' \
@@ -66,7 +77,7 @@ class ProductScraper(BaseWorkflow):
             data = requests.get('{product_endpoint}&currentPage=1'.format(
                 product_endpoint=products_endpoint))
             if data.content:
-                data = data.json()
+                data = json_codec.loads_response(data)
                 total_products = data.get('total_products', 0)
                 total_pages = math.ceil(total_products/self.PAGE_SIZE)
                 for page in range(2, total_pages+1):
@@ -74,21 +85,23 @@ class ProductScraper(BaseWorkflow):
                         '{product_endpoint}&currentPage={page}'.format(
                             product_endpoint=products_endpoint,
                             page=page))
-                    data['products'].extend(r.json().get('products', list()))
+                    data['products'].extend(json_codec.loads_response(r).get('products', list()))
                 return data
         except Exception as error:
             logger.error(error, products_endpoint)
             return {'product_endpoint': products_endpoint}
 
+    @profiled('serialize')
     def save_product_data(self, product_data, name):
         print('saving', name, 'product_data')
         with open(os.path.join(self.product_path,
-                               name), 'w') as outfile:
+                               name), 'w', encoding='utf-8') as outfile:
             try:
-                json.dump(product_data, outfile, sort_keys=True, indent=4)
+                json_codec.dump(product_data, outfile)
             except json.decoder.JSONDecodeError:
                 pass
 
+    @profiled('enrich')
     def add_products_sku_ids_and_category(self, data, category):
         enriched = list()
         for product in data:
@@ -100,6 +113,7 @@ class ProductScraper(BaseWorkflow):
             enriched.append(product_extra)
         return {'products': enriched}
 
+    @profiled('fetch')
     def get_product_sku_ids(self, product_id):
         product_endpoint = '{PRODUCT_ENDPOINT}/' \
                            '{product_id}'.format(PRODUCT_ENDPOINT=self.PRODUCT_ENDPOINT,
@@ -107,38 +121,43 @@ class ProductScraper(BaseWorkflow):
         try:
             data = requests.get(product_endpoint)
             if data.content:
-                json_format = data.json()
+                json_format = json_codec.loads_response(data)
                 return json_format.get('sku_ids', str()).split(','),\
                        json_format.get('quick_look_desc', None)
         except Exception as error:
             logger.error(error, product_endpoint)
             return {'product_endpoint': product_endpoint}
 
-    def quit(self):
-        self.driver.quit()
-
 
 class SkuScraper(BaseWorkflow):
 
     SKU_ENDPOINT = 'http://www.sephora.com/global/json/getSkuJson.jsp'
+    CHUNK_SIZE = 64 * 1024
 
     def __init__(self, categories=None):
         super(SkuScraper, self).__init__()
         self.product_path = os.path.join(self.data_path, 'products_new')
         self.sku_path = os.path.join(self.data_path, 'skus_new')
         self.categories = categories
+        self.keep_raw = False
+        # re-raise after recording a failed request, for callers that retry
+        self.raise_on_error = False
 
     def process(self):
         self.save_sku_data()
 
-    def save_sku_data(self, products, category):
-        product_skus_data = self.get_product_skus_data(
-            products['products'], category)
-        self.save_product_skus_data(
-            product_skus_data,
-            os.path.join(
-                self.sku_path,
-                category))
+    def save_sku_data(self, products, category, name=None):
+        name = os.path.join(self.sku_path, name or category)
+        print('saving', name, 'sku_data')
+        with open(name, 'w', encoding='utf-8') as outfile:
+            with JsonObjectWriter(outfile, default=to_json) as writer:
+                for sku_number, sku in self.iter_skus_data(products['products'], category):
+                    self.write_sku(writer, sku_number, sku)
+        return writer.count
+
+    @profiled('serialize')
+    def write_sku(self, writer, sku_number, sku):
+        writer.write(sku_number, sku)
 
     def get_product_skus_data(self, products, category):
         product_skus_data = dict()
@@ -147,53 +166,58 @@ class SkuScraper(BaseWorkflow):
         return product_skus_data
 
     def get_skus_data(self, products, category):
-        skus_data = dict()
-        product_sku_mapping = dict()
-        skus = []
-        for product in products:
-            product_sku_mapping.update({sku: product for sku in product['sku_ids']})
-            skus.extend(product['sku_ids'])
+        return dict(self.iter_skus_data(products, category))
+
+    def iter_skus_data(self, products, category):
+        product_sku_mapping = build_mapping(products)
+        skus = list(product_sku_mapping['skus'])
         skus_endpoint = '{SKU_ENDPOINT}' \
                         '?skuId={sku_ids}' \
                         '&include_product' \
                         '=true'.format(SKU_ENDPOINT=self.SKU_ENDPOINT,
                                        sku_ids=','.join(skus))
-        current_data = None
+        received = list()
         try:
-            data = requests.get(skus_endpoint)
-            if data.content:
-                data = data.json()
-                current_data = data
-                if isinstance(data, list):
-                    for sku in data:
-                        sku_number = sku['sku_number']
-                        skus_data[sku_number] = sku
-                        skus_data[sku_number]['variation_type'] = self.get_variation_type(sku,
-                                                                                          product_sku_mapping[sku_number])
-                        skus_data[sku_number]['quick_look_desc'] = product_sku_mapping[sku_number].get(
-                            'quick_look_desc', None)
-                        skus_data[sku_number]['category'] = product_sku_mapping[sku_number].get('category', None)
-                else:
-                    sku_number = data['sku_number']
-                    skus_data[sku_number] = data
-                    skus_data[sku_number]['variation_type'] = self.get_variation_type(data,
-                                                                                      product_sku_mapping[sku_number])
-                    skus_data[sku_number]['quick_look_desc'] = product_sku_mapping[sku_number].get('quick_look_desc', None)
-                    skus_data[sku_number]['category'] = product_sku_mapping[sku_number].get('category', None)
+            with self.get_skus_response(skus_endpoint) as response:
+                # parse time excludes the fetch time of the chunks it reads
+                chunks = profiled_iter('fetch', response.iter_content(self.CHUNK_SIZE))
+                skus_data = iter_json_items(chunks,
+                                            encoding=response.encoding or 'utf-8',
+                                            object_hook=SkuRecord.object_hook(self.keep_raw))
+                for sku in profiled_iter('parse', skus_data):
+                    sku_number = sku['sku_number']
+                    product = get_product(product_sku_mapping, sku_number)
+                    sku['variation_type'] = self.get_variation_type(sku, product)
+                    sku['quick_look_desc'] = product.get('quick_look_desc', None)
+                    sku['category'] = product.get('category', None)
+                    received.append(sku_number)
+                    yield sku_number, sku
         except Exception as error:
             print(error, skus_endpoint)
             self.save_error({'skus_endpoint': skus_endpoint,
-                             'data': current_data if current_data else None,
+                             'data': received if received else None,
                              'mapping': product_sku_mapping,
                              'category': category}, category)
-        return skus_data
+            if self.raise_on_error:
+                raise
 
-    def save_error(self, error, category):
-        with open('/Users/mars_williams/kiss_and_makeup/data/'
-                  'errors/sku_mapping_{category}_{sku}.json'.format(category=category,
-                                                                      sku=error['skus_endpoint'].split(',')[1]), 'w') as mapping_record:
-            json.dump(error, mapping_record, sort_keys=True, indent=4)
+    @profiled('fetch')
+    def get_skus_response(self, skus_endpoint):
+        response = requests.get(skus_endpoint, stream=True)
+        response.raise_for_status()
+        return response
 
+    @profiled('serialize')
+    def save_error(self, error, category):
+        # named after the request's first sku, a chunk may ask for only one
+        sku = next(iter(error['mapping']['skus']), None)
+        with open(os.path.join(self.data_path,
+                               'errors',
+                               'sku_mapping_{category}_{sku}.json'.format(category=category,
+                                                                          sku=sku)), 'w', encoding='utf-8') as mapping_record:
+            json_codec.dump(error, mapping_record, pretty=False, default=to_json)
+
+    @profiled('enrich')
     def get_variation_type(self, sku, product):
         if sku.get('primary_product', None) and sku['primary_product'].get('variation_type', None):
             return sku['primary_product']['variation_type']
@@ -204,11 +228,13 @@ class SkuScraper(BaseWorkflow):
 
     def save_product_skus_data(self, data, name):
         print('saving', name, 'sku_data')
-        with open(name, 'w') as outfile:
+        with open(name, 'w', encoding='utf-8') as outfile:
             try:
-                json.dump(data, outfile, sort_keys=True, indent=4)
+                json_codec.dump(data, outfile, default=to_json)
             except json.decoder.JSONDecodeError:
                 logger.error(name)
 
-ProductScraper().process()
+
+if __name__ == '__main__':
+    ProductScraper().process()
 
@@ -5,13 +5,14 @@ import json
 import logging
 import math
 import os
-from urllib.parse import urlparse
 
 import requests
-from selenium import webdriver
-from selenium.webdriver.common.by import By
 
+from utilities import json_codec
+from utilities.profiling import profiled
 from workflows.base_workflow import BaseWorkflow
+from workflows.sku_mapping import build_mapping, normalize_mapping
+from workflows.sku_record import loads_skus, to_json
 
 logger = logging.getLogger(__name__)
 
@@ -31,11 +32,10 @@ class ProductScraper(BaseWorkflow):
 
     def process(self):
         self.save_products_data(self.categories)
-        self.quit()
 
     def get_revised_categories(self):
-        with open('/Users/mars_williams/kiss_and_makeup/revised_categories.json') as categories:
-            cat = json.loads(categories.read())
+        with open(os.path.join(self.root_path, 'revised_categories.json'), encoding='utf-8') as categories:
+            cat = json_codec.load(categories)
             return {k: cat[k] for k in cat if cat[k]}
 
     def save_products_data(self, categories):
@@ -66,7 +66,7 @@ class ProductScraper(BaseWorkflow):
             data = requests.get('{product_endpoint}&currentPage=1'.format(
                 product_endpoint=products_endpoint))
             if data.content:
-                data = data.json()
+                data = json_codec.loads_response(data)
                 total_products = data.get('total_products', 0)
                 total_pages = math.ceil(total_products/self.PAGE_SIZE)
                 for page in range(2, total_pages+1):
@@ -74,7 +74,7 @@ class ProductScraper(BaseWorkflow):
                         '{product_endpoint}&currentPage={page}'.format(
                             product_endpoint=products_endpoint,
                             page=page))
-                    data['products'].extend(r.json().get('products', list()))
+                    data['products'].extend(json_codec.loads_response(r).get('products', list()))
                 return data
         except Exception as error:
             logger.error(error, products_endpoint)
@@ -83,9 +83,9 @@ class ProductScraper(BaseWorkflow):
     def save_product_data(self, product_data, name):
         print('saving', name, 'product_data')
         with open(os.path.join(self.product_path,
-                               name), 'w') as outfile:
+                               name), 'w', encoding='utf-8') as outfile:
             try:
-                json.dump(product_data, outfile, sort_keys=True, indent=4)
+                json_codec.dump(product_data, outfile)
             except json.decoder.JSONDecodeError:
                 pass
 
@@ -107,16 +107,13 @@ class ProductScraper(BaseWorkflow):
         try:
             data = requests.get(product_endpoint)
             if data.content:
-                json_format = data.json()
+                json_format = json_codec.loads_response(data)
                 return json_format.get('sku_ids', str()).split(','),\
                        json_format.get('quick_look_desc', None)
         except Exception as error:
             logger.error(error, product_endpoint)
             return {'product_endpoint': product_endpoint}
 
-    def quit(self):
-        self.driver.quit()
-
 
 class SkuScraper(BaseWorkflow):
 
@@ -128,24 +125,26 @@ class SkuScraper(BaseWorkflow):
         self.sku_path = os.path.join(self.data_path, 'skus_missed')
         self.error_path = os.path.join(self.data_path, 'errors')
         self.categories = categories
+        self.keep_raw = False
 
     def process(self):
         errors = self.get_error_data()
         self.save_sku_data(errors)
 
+    @profiled('parse')
     def get_error_data(self):
         error_data = list()
         files = [os.path.join(self.error_path, file) for file in os.listdir(self.error_path)]
         for file_name in files:
-            with open(file_name) as error:
-                e = json.loads(error.read())
+            with open(file_name, encoding='utf-8') as error:
+                e = json_codec.load(error)
                 error_data.append(e)
         return error_data
 
     def save_sku_data(self, errors):
         for error in errors:
             product_skus_data = self.get_product_skus_data(
-                error['mapping'], error['category'])
+                normalize_mapping(error['mapping'])['products'], error['category'])
             self.save_product_skus_data(
                 product_skus_data,
                 os.path.join(
@@ -158,9 +157,9 @@ class SkuScraper(BaseWorkflow):
         product_skus_data.update(data)
         return product_skus_data
 
+    @profiled('fetch')
     def get_skus_data(self, products, category):
         skus_data = dict()
-        product_sku_mapping = dict()
         for product in products:
             skus = ','.join((products[product]['sku_ids']))
             skus_endpoint = '{SKU_ENDPOINT}' \
@@ -172,7 +171,7 @@ class SkuScraper(BaseWorkflow):
             try:
                 data = requests.get(skus_endpoint)
                 if data.content:
-                    data = data.json()
+                    data = loads_skus(data.content, self.keep_raw)
                     current_data = data
                     if isinstance(data, list):
                         for sku in data:
@@ -195,20 +194,23 @@ class SkuScraper(BaseWorkflow):
                 print(error, skus_endpoint)
                 self.save_error({'skus_endpoint': skus_endpoint,
                                  'data': current_data if current_data else None,
-                                 'mapping': product_sku_mapping,
+                                 'mapping': build_mapping([products[product]]),
                                  'category': category}, category)
         return skus_data
 
+    @profiled('serialize')
     def save_error(self, error, category):
         try:
             endpoint = error['skus_endpoint'].split(',')[1]
         except:
             endpoint = error['skus_endpoint'].split('skuId=')[1]
-        with open('/Users/mars_williams/kiss_and_makeup/data/'
-                  'errors/sku_mapping_{category}_{sku}.json'.format(category=category,
-                                                                    sku=endpoint), 'w') as mapping_record:
-            json.dump(error, mapping_record, sort_keys=True, indent=4)
+        with open(os.path.join(self.data_path,
+                               'errors',
+                               'sku_mapping_{category}_{sku}.json'.format(category=category,
+                                                                          sku=endpoint)), 'w', encoding='utf-8') as mapping_record:
+            json_codec.dump(error, mapping_record, pretty=False, default=to_json)
 
+    @profiled('enrich')
     def get_variation_type(self, sku, product):
         if sku.get('primary_product', None) and sku['primary_product'].get('variation_type', None):
             return sku['primary_product']['variation_type']
@@ -217,13 +219,16 @@ class SkuScraper(BaseWorkflow):
         else:
             return None
 
+    @profiled('serialize')
     def save_product_skus_data(self, data, name):
         print('saving', name, 'sku_data')
-        with open(name, 'w') as outfile:
+        with open(name, 'w', encoding='utf-8') as outfile:
             try:
-                json.dump(data, outfile, sort_keys=True, indent=4)
+                json_codec.dump(data, outfile, default=to_json)
             except json.decoder.JSONDecodeError:
                 logger.error(name)
 
-SkuScraper().process()
+
+if __name__ == '__main__':
+    SkuScraper().process()
 
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Crawl split across worker processes that share a SQLite work queue
+#
+# seed() queues one 'category' task per planned category. A category task
+# fetches and saves the product listing, then queues a 'skus' task per chunk
+# of products and a 'merge' task that only runs once every chunk of that
+# category is finished. A chunk whose request fails is retried up to the
+# queue's max_attempts; a merge fails without retries when any chunk of its
+# category has failed, and replaces the category's file only once the new
+# one is complete. Workers can run on any box that mounts the same
+# data directory, NFS included; see utilities/work_queue.py for the locking.
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+
+from utilities import json_codec
+from utilities.json_stream import JsonObjectWriter
+from utilities.work_queue import TaskFailed, WorkQueue, get_worker_id
+from workflows.base_workflow import BaseWorkflow
+from workflows.crawl_scheduler import CrawlScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class ShardedCrawl(BaseWorkflow):
+
+    SKU_CHUNK_SIZE = 250
+    POLL_SECONDS = 1
+
+    def __init__(self, queue_path=None, lease_seconds=60):
+        super(ShardedCrawl, self).__init__()
+        self.queue_path = queue_path or os.path.join(self.data_path, 'crawl_queue.sqlite')
+        self.queue = WorkQueue(self.queue_path, lease_seconds=lease_seconds)
+        self.scraper = None
+
+    def process(self):
+        self.seed(self.get_scraper().categories)
+        self.run_local(multiprocessing.cpu_count())
+
+    def get_scraper(self):
+        if self.scraper is None:
+            from workflows.sephora_scraper_static import ProductScraper
+
+            self.scraper = ProductScraper()
+            # a chunk that could not be fetched fails its task so it is retried
+            self.scraper.sku_scraper.raise_on_error = True
+        return self.scraper
+
+    def seed(self, categories):
+        scheduler = CrawlScheduler(scraper=self.get_scraper())
+        queued = 0
+        for category in scheduler.plan(categories):
+            priority = scheduler.estimate(category)
+            queued += self.queue.put('category', category,
+                                     {'category': category,
+                                      'revised_category': categories[category],
+                                      'priority': priority},
+                                     priority=priority)
+        print('queued', queued, 'categories in', self.queue_path)
+        return queued
+
+    def run_worker(self, worker_id=None, wait=True):
+        worker_id = worker_id or get_worker_id()
+        handlers = {'category': self.crawl_category,
+                    'skus': self.crawl_skus,
+                    'merge': self.merge_skus}
+        done = 0
+        while True:
+            task = self.queue.lease(worker_id)
+            if task is None:
+                if not wait or self.queue.is_finished():
+                    break
+                time.sleep(self.POLL_SECONDS)
+                continue
+            heartbeat = Heartbeat(self.queue, task, worker_id)
+            heartbeat.start()
+            try:
+                handlers[task.kind](task.payload)
+            except Exception as error:
+                logger.error('%s %s failed: %s', task.kind, task.key, error)
+                heartbeat.stop()
+                self.queue.fail(task, worker_id, error, retry=not isinstance(error, TaskFailed))
+                continue
+            heartbeat.stop()
+            if self.queue.complete(task, worker_id):
+                done += 1
+            else:
+                logger.error('%s lost the lease on %s', worker_id, task.key)
+        print(worker_id, 'finished', done, 'tasks')
+        return done
+
+    def run_local(self, workers):
+        processes = [multiprocessing.Process(target=self.run_worker) for _ in range(workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        return self.queue.counts()
+
+    def get_parts_path(self, category):
+        return os.path.join(self.get_scraper().sku_scraper.sku_path,
+                            '{}.parts'.format(category.replace(' ', '_')))
+
+    def crawl_category(self, payload):
+        scraper = self.get_scraper()
+        category = payload['category']
+        data = scraper.get_product_data(category.replace('.json', ''))
+        data.update(scraper.add_products_sku_ids_and_category(
+            data.get('products', list()), payload['revised_category']))
+        scraper.save_product_data(data, category.replace(' ', '_'))
+
+        os.makedirs(self.get_parts_path(category), exist_ok=True)
+        chunk, chunks, skus = list(), 0, 0
+        for product in data['products'] + [None]:
+            if product is not None:
+                chunk.append(product)
+                skus += len(product['sku_ids'])
+            if chunk and (product is None or skus >= self.SKU_CHUNK_SIZE):
+                self.queue.put('skus', '{}:{:04d}'.format(category, chunks),
+                               {'category': category, 'chunk': chunks, 'products': chunk},
+                               priority=payload['priority'], parent=category)
+                chunk, chunks, skus = list(), chunks + 1, 0
+        self.queue.put('merge', 'merge:{}'.format(category), {'category': category},
+                       priority=payload['priority'], wait_for=category)
+
+    def crawl_skus(self, payload):
+        self.get_scraper().sku_scraper.save_sku_data(
+            products={'products': payload['products']},
+            category=payload['category'].replace(' ', '_'),
+            name=os.path.join(self.get_parts_path(payload['category']),
+                              '{:04d}.json'.format(payload['chunk'])))
+
+    def merge_skus(self, payload):
+        # a missing chunk would silently drop its skus from the category
+        failed = self.queue.child_counts(payload['category']).get('failed', 0)
+        if failed:
+            raise TaskFailed('{} sku chunks of {} failed'.format(failed, payload['category']))
+        category = payload['category'].replace(' ', '_')
+        parts_path = self.get_parts_path(category)
+        name = os.path.join(self.get_scraper().sku_scraper.sku_path, category)
+        if not os.path.isdir(parts_path) and os.path.exists(name):
+            # a worker died after merging, before completing the task
+            print('already merged', name)
+            return
+        temporary = '{}.tmp'.format(name)
+        with open(temporary, 'w', encoding='utf-8') as outfile:
+            with JsonObjectWriter(outfile) as writer:
+                for part in sorted(os.listdir(parts_path)) if os.path.isdir(parts_path) else list():
+                    with open(os.path.join(parts_path, part), encoding='utf-8') as skus:
+                        for sku_number, sku in json_codec.load(skus).items():
+                            writer.write(sku_number, sku)
+        os.replace(temporary, name)
+        shutil.rmtree(parts_path, ignore_errors=True)
+        print('merged', writer.count, 'skus into', name)
+
+
+class Heartbeat(threading.Thread):
+
+    def __init__(self, queue, task, owner):
+        super(Heartbeat, self).__init__(daemon=True)
+        self.queue = queue
+        self.task = task
+        self.owner = owner
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.queue.lease_seconds / 3.0):
+            if not self.queue.heartbeat(self.task, self.owner):
+                logger.error('%s lost the lease on %s', self.owner, self.task.key)
+                return
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
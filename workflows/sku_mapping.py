@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Normalized sku -> product mappings: one product table plus sku -> product id
+import logging
+import os
+
+from utilities import json_codec
+
+logger = logging.getLogger(__name__)
+
+
+def build_mapping(products):
+    mapping = {'skus': dict(), 'products': dict()}
+    for product in products:
+        mapping['products'][product['id']] = product
+        mapping['skus'].update({sku: product['id'] for sku in product['sku_ids']})
+    return mapping
+
+
+def is_normalized(mapping):
+    return set(mapping) == {'skus', 'products'}
+
+
+def normalize_mapping(mapping):
+    # mappings saved before normalization point every sku at a full product copy;
+    # keep each sku's recorded product, a sku listed by two products may
+    # not be in the last one's sku_ids
+    if is_normalized(mapping):
+        return mapping
+    return {'skus': {sku: product['id'] for sku, product in mapping.items()},
+            'products': {product['id']: product for product in mapping.values()}}
+
+
+def get_product(mapping, sku):
+    return mapping['products'][mapping['skus'][sku]]
+
+
+def normalize_mapping_files(path):
+    saved = 0
+    for filename in sorted(os.listdir(path)):
+        file_name = os.path.join(path, filename)
+        with open(file_name, encoding='utf-8') as record:
+            data = json_codec.load(record)
+        if is_normalized(data.get('mapping', dict())):
+            continue
+        data['mapping'] = normalize_mapping(data['mapping'])
+        with open(file_name, 'w', encoding='utf-8') as record:
+            json_codec.dump(data, record, pretty=False)
+        saved += 1
+    logger.info('normalized %s mapping files in %s', saved, path)
+    return saved
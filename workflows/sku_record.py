@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Compact SKU records holding only the getSkuJson.jsp fields the loader reads
+import sys
+
+from utilities import json_codec
+
+PRODUCT_FIELDS = ('brand_name', 'display_name', 'variation_type')
+INTERNED_FIELDS = ('category', 'variation_type', 'sku_size')
+
+
+class SkuRecord:
+
+    FIELDS = ('sku_number', 'primary_product_id', 'category', 'variation_type',
+              'variation_value', 'sku_size', 'list_price', 'ingredients',
+              'quick_look_desc', 'additional_sku_desc', 'swatch_image',
+              'grid_images', 'thumb_images', 'large_images', 'hero_images')
+
+    # a slot left unset behaves like a missing key in the original dict
+    __slots__ = FIELDS + ('primary_product', 'raw')
+
+    def __init__(self, data, keep_raw=False):
+        for field in self.FIELDS:
+            if field in data:
+                value = data[field]
+                if field in INTERNED_FIELDS and isinstance(value, str):
+                    value = sys.intern(value)
+                setattr(self, field, value)
+        product = data.get('primary_product', None)
+        if isinstance(product, dict):
+            self.primary_product = tuple(
+                sys.intern(product[k]) if isinstance(product.get(k, None), str) else product.get(k, None)
+                for k in PRODUCT_FIELDS)
+        elif 'primary_product' in data:
+            self.primary_product = product
+        self.raw = data if keep_raw else None
+
+    @classmethod
+    def object_hook(cls, keep_raw=False):
+        def hook(data):
+            if 'sku_number' in data:
+                return cls(data, keep_raw)
+            return data
+        return hook
+
+    def __contains__(self, key):
+        if key in self.__slots__ and key != 'raw':
+            return hasattr(self, key)
+        return self.raw is not None and key in self.raw
+
+    def __getitem__(self, key):
+        if key == 'primary_product':
+            try:
+                product = getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+            if isinstance(product, tuple):
+                return {k: v for k, v in zip(PRODUCT_FIELDS, product) if v is not None}
+            return product
+        if key in self.FIELDS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        if self.raw is not None:
+            return self.raw[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self.FIELDS:
+            setattr(self, key, value)
+        elif self.raw is None:
+            raise KeyError('{} is not kept without keep_raw'.format(key))
+        if self.raw is not None:
+            self.raw[key] = value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_json(self):
+        if self.raw is not None:
+            return self.raw
+        data = {field: getattr(self, field) for field in self.FIELDS if hasattr(self, field)}
+        if hasattr(self, 'primary_product'):
+            data['primary_product'] = self['primary_product']
+        return data
+
+    def __repr__(self):
+        return 'SkuRecord({})'.format(getattr(self, 'sku_number', None))
+
+
+def loads_skus(text, keep_raw=False):
+    return json_codec.loads(text, object_hook=SkuRecord.object_hook(keep_raw))
+
+
+def to_json(value):
+    if isinstance(value, SkuRecord):
+        return value.to_json()
+    raise TypeError('{!r} is not JSON serializable'.format(value))
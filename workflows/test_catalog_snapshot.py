@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Build-then-lookup tests for workflows/catalog_snapshot.py
+#
+#     python -m pytest workflows
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('KISS_AND_MAKEUP_ROOT', ROOT_PATH)
+
+from workflows.catalog_snapshot import CatalogSnapshot, iter_sku_files, write_snapshot
+from workflows.sephora_loader import SephoraLoader
+
+# unsorted, of different lengths, so padding and ordering both matter
+SKUS = {sku_number: {'sku_number': sku_number, 'list_price': '${}.00'.format(len(sku_number)),
+                     'variation_value': 'crème ✨ {}'.format(sku_number)}
+        for sku_number in ('1759523', '9', '10', '1000017', '250', '1759522', '99999999')}
+
+
+class CatalogSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp(prefix='kiss_and_makeup_snapshot_')
+        self.path = os.path.join(self.tmp_path, 'catalog.snapshot')
+        self.assertEqual(write_snapshot(self.path, SKUS.items()), len(SKUS))
+        self.snapshot = CatalogSnapshot(self.path)
+
+    def tearDown(self):
+        self.snapshot.close()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+    def test_every_sku_is_found(self):
+        self.assertEqual(len(self.snapshot), len(SKUS))
+        for sku_number, sku in SKUS.items():
+            with self.subTest(sku_number=sku_number):
+                self.assertEqual(self.snapshot.get(sku_number, keep_raw=True).to_json(), sku)
+                self.assertEqual(json.loads(self.snapshot.get_bytes(sku_number)), sku)
+                self.assertEqual(self.snapshot.get(sku_number)['list_price'], sku['list_price'])
+
+    def test_first_and_last_keys_of_the_index(self):
+        keys = list(self.snapshot.keys())
+        self.assertEqual(keys, sorted(SKUS, key=lambda sku_number: sku_number.encode('utf-8')))
+        for sku_number in (keys[0], keys[-1]):
+            with self.subTest(sku_number=sku_number):
+                self.assertIn(sku_number, self.snapshot)
+                self.assertEqual(self.snapshot.get(sku_number)['sku_number'], sku_number)
+
+    def test_missing_keys(self):
+        # before the first key, between keys, after the last, and wider than the index
+        for sku_number in ('0', '1000018', '1759524', 'z', '100000000', ''):
+            with self.subTest(sku_number=sku_number):
+                self.assertNotIn(sku_number, self.snapshot)
+                self.assertIsNone(self.snapshot.get(sku_number))
+                self.assertIsNone(self.snapshot.get_bytes(sku_number))
+
+    def test_contains_accepts_numbers(self):
+        self.assertIn(1759523, self.snapshot)
+        self.assertIn('250', self.snapshot)
+        self.assertNotIn(251, self.snapshot)
+
+    def test_empty_snapshot(self):
+        path = os.path.join(self.tmp_path, 'empty.snapshot')
+        self.assertEqual(write_snapshot(path, iter(())), 0)
+        with CatalogSnapshot(path) as snapshot:
+            self.assertEqual((len(snapshot), list(snapshot.keys())), (0, list()))
+            self.assertNotIn('9', snapshot)
+
+    def test_other_files_are_rejected(self):
+        path = os.path.join(self.tmp_path, 'skus.json')
+        with open(path, 'w', encoding='utf-8') as skus:
+            json.dump(SKUS, skus, indent=4)
+        with self.assertRaises(ValueError):
+            CatalogSnapshot(path)
+
+    def test_built_from_sku_files(self):
+        path = os.path.join(self.tmp_path, 'skus.json')
+        with open(path, 'w', encoding='utf-8') as skus:
+            json.dump(dict(SKUS, broken='not a sku'), skus, indent=4)
+        snapshot_path = os.path.join(self.tmp_path, 'files.snapshot')
+        self.assertEqual(write_snapshot(snapshot_path, iter_sku_files([path])), len(SKUS))
+        with CatalogSnapshot(snapshot_path) as snapshot:
+            self.assertNotIn('broken', snapshot)
+            self.assertEqual(snapshot.get('10', keep_raw=True).to_json(), SKUS['10'])
+
+
+class RecordingLoader(SephoraLoader):
+
+    def __init__(self):
+        super(RecordingLoader, self).__init__()
+        self.posted = list()
+
+    def transform_product_data(self, data):
+        return data['sku_number']
+
+    def post_product_data(self, product):
+        self.posted.append(product)
+
+
+class LoadSkusTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp(prefix='kiss_and_makeup_snapshot_')
+        self.path = os.path.join(self.tmp_path, 'catalog.snapshot')
+        write_snapshot(self.path, SKUS.items())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+    def test_load_skus_posts_the_skus_it_finds(self):
+        loader = RecordingLoader()
+        loader.load_skus(self.path, ['9', 'missing', 1759522])
+        self.assertEqual(loader.posted, ['9', '1759522'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# SkuScraper's streamed sku requests against canned getSkuJson.jsp bodies
+#
+#     python -m pytest workflows
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('KISS_AND_MAKEUP_ROOT', ROOT_PATH)
+
+from workflows.sephora_scraper_static import SkuScraper
+
+PRODUCTS = [{'id': 'P1', 'sku_ids': ['1', '2'], 'variation_type': 'Color'}]
+
+
+class CannedResponse:
+
+    encoding = 'utf-8'
+
+    def __init__(self, body):
+        self.body = body.encode('utf-8')
+
+    def iter_content(self, size):
+        for start in range(0, len(self.body), 7):
+            yield self.body[start:start + 7]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class CannedSkuScraper(SkuScraper):
+
+    def __init__(self, body, data_path):
+        super(CannedSkuScraper, self).__init__()
+        self.body = body
+        self.data_path = data_path
+        self.requested = list()
+
+    def get_skus_response(self, skus_endpoint):
+        self.requested.append(skus_endpoint)
+        return CannedResponse(self.body)
+
+
+class SkuScraperTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp(prefix='kiss_and_makeup_skus_')
+        os.makedirs(os.path.join(self.tmp_path, 'errors'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+    def get_errors(self):
+        errors = list()
+        for filename in sorted(os.listdir(os.path.join(self.tmp_path, 'errors'))):
+            with open(os.path.join(self.tmp_path, 'errors', filename), encoding='utf-8') as error:
+                errors.append((filename, json.load(error)))
+        return errors
+
+    def test_skus_are_enriched_from_their_product(self):
+        scraper = CannedSkuScraper('[{"sku_number": "1"}, {"sku_number": "2"}]', self.tmp_path)
+        skus = scraper.get_skus_data(PRODUCTS, 'blush')
+        self.assertEqual(sorted(skus), ['1', '2'])
+        self.assertEqual(skus['2']['variation_type'], 'Color')
+        self.assertEqual(self.get_errors(), list())
+
+    def test_null_in_the_stream_is_recorded_not_taken_for_the_end(self):
+        scraper = CannedSkuScraper('[{"sku_number": "1"}, null, {"sku_number": "2"}]', self.tmp_path)
+        self.assertEqual(list(scraper.get_skus_data(PRODUCTS, 'blush')), ['1'])
+        [(filename, error)] = self.get_errors()
+        self.assertEqual(filename, 'sku_mapping_blush_1.json')
+        self.assertEqual(error['data'], ['1'])
+
+    def test_error_for_a_single_sku_request_is_saved(self):
+        scraper = CannedSkuScraper('[null]', self.tmp_path)
+        scraper.raise_on_error = True
+        with self.assertRaises(TypeError):
+            scraper.get_skus_data([{'id': 'P9', 'sku_ids': ['9']}], 'blush')
+        [(filename, error)] = self.get_errors()
+        self.assertEqual(filename, 'sku_mapping_blush_9.json')
+        self.assertTrue(error['skus_endpoint'].endswith('?skuId=9&include_product=true'))
+
+    def test_raise_on_error(self):
+        scraper = CannedSkuScraper('[{"sku_number": "1"}, null]', self.tmp_path)
+        scraper.raise_on_error = True
+        with self.assertRaises(TypeError):
+            scraper.get_skus_data(PRODUCTS, 'blush')
+        self.assertEqual(len(self.get_errors()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
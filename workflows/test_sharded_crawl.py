@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Failure handling of workflows/sharded_crawl.py against a temporary queue
+#
+#     python -m pytest workflows
+import json
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('KISS_AND_MAKEUP_ROOT', ROOT_PATH)
+
+from workflows.sharded_crawl import ShardedCrawl
+
+PRODUCTS = [{'id': 'P1', 'sku_ids': ['1', '2']}, {'id': 'P2', 'sku_ids': ['3']}]
+
+
+def get_closed_port():
+    with socket.socket() as listener:
+        listener.bind(('127.0.0.1', 0))
+        return listener.getsockname()[1]
+
+
+class ShardedCrawlTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp(prefix='kiss_and_makeup_sharded_')
+        self.crawl = ShardedCrawl(queue_path=os.path.join(self.tmp_path, 'queue.sqlite'))
+        sku_scraper = self.crawl.get_scraper().sku_scraper
+        sku_scraper.data_path = self.tmp_path
+        sku_scraper.sku_path = self.tmp_path
+        sku_scraper.SKU_ENDPOINT = 'http://127.0.0.1:{}/getSkuJson.jsp'.format(get_closed_port())
+        os.makedirs(os.path.join(self.tmp_path, 'errors'))
+        os.makedirs(self.crawl.get_parts_path('blush'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+    def test_failed_chunk_is_retried_and_blocks_the_merge(self):
+        self.crawl.queue.put('skus', 'blush:0000', {'category': 'blush', 'chunk': 0, 'products': PRODUCTS},
+                             parent='blush')
+        self.crawl.queue.put('merge', 'merge:blush', {'category': 'blush'}, wait_for='blush')
+        self.crawl.run_worker('worker', wait=False)
+        self.assertEqual(self.crawl.queue.counts(), {'skus': {'failed': 1}, 'merge': {'failed': 1}})
+        with self.crawl.queue.connect() as connection:
+            rows = dict(connection.execute('SELECT key, attempts FROM tasks').fetchall())
+        # retrying the merge cannot bring the chunk back
+        self.assertEqual(rows, {'blush:0000': 3, 'merge:blush': 1})
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_path, 'blush')))
+        # the request is still recorded for a later look
+        self.assertEqual(len(os.listdir(os.path.join(self.tmp_path, 'errors'))), 1)
+
+    def test_merge_joins_the_parts_once_every_chunk_is_done(self):
+        for chunk, skus in enumerate(({'1': {'sku_number': '1'}}, {'3': {'sku_number': '3'}})):
+            name = os.path.join(self.crawl.get_parts_path('blush'), '{:04d}.json'.format(chunk))
+            with open(name, 'w', encoding='utf-8') as part:
+                json.dump(skus, part)
+        self.crawl.merge_skus({'category': 'blush'})
+        with open(os.path.join(self.tmp_path, 'blush'), encoding='utf-8') as merged:
+            self.assertEqual(json.load(merged), {'1': {'sku_number': '1'}, '3': {'sku_number': '3'}})
+        self.assertFalse(os.path.exists(self.crawl.get_parts_path('blush')))
+        self.assertEqual(sorted(os.listdir(self.tmp_path)), ['blush', 'errors', 'queue.sqlite'])
+
+    def test_merge_retried_after_the_parts_are_gone_keeps_the_merged_file(self):
+        with open(os.path.join(self.crawl.get_parts_path('blush'), '0000.json'), 'w', encoding='utf-8') as part:
+            json.dump({'1': {'sku_number': '1'}}, part)
+        self.crawl.merge_skus({'category': 'blush'})
+        self.crawl.merge_skus({'category': 'blush'})
+        with open(os.path.join(self.tmp_path, 'blush'), encoding='utf-8') as merged:
+            self.assertEqual(json.load(merged), {'1': {'sku_number': '1'}})
+
+
+if __name__ == '__main__':
+    unittest.main()